@@ -0,0 +1,94 @@
+# Copyright Sierra
+
+"""Measure the memory of env data with many episodes in flight, with the
+database stored as dicts or in compact form (`--compact-data`).
+
+Each mode runs in a fresh process, which builds one env per concurrent
+episode, resets each to a task and applies the task's ground-truth actions,
+keeping all of them alive:
+
+    python benchmarks/bench_data_memory.py --env retail --num-episodes 128
+"""
+
+import gc
+import os
+import argparse
+import resource
+import multiprocessing
+from typing import Any, Dict, List
+
+from tau_bench.tracing import untraced
+
+
+def get_rss_mb() -> float:
+    """The current resident set size, or the peak where it is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def measure(env_name: str, num_episodes: int, compact_data: bool) -> Dict[str, float]:
+    from tau_bench.envs import get_env
+
+    gc.collect()
+    start_rss = get_rss_mb()
+    envs: List[Any] = []
+    for i in range(num_episodes):
+        env = get_env(
+            env_name,
+            user_strategy="human",
+            user_model="",
+            task_split="test",
+            task_index=0,
+            compact_data=compact_data,
+        )
+        env._reset_task(i % len(env.tasks))
+        with untraced():
+            for action in env.task.actions:
+                if action.name not in env.terminate_tools:
+                    env.step(action)
+        envs.append(env)
+        if i == 0:
+            gc.collect()
+            first_rss = get_rss_mb()
+    gc.collect()
+    end_rss = get_rss_mb()
+    return {
+        "data_mb": first_rss - start_rss,
+        "per_episode_kb": (end_rss - first_rss) * 1e3 / max(num_episodes - 1, 1),
+        "total_mb": end_rss - start_rss,
+    }
+
+
+def _measure_in_process(queue: Any, env_name: str, num_episodes: int, compact_data: bool) -> None:
+    queue.put(measure(env_name, num_episodes, compact_data))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, choices=["retail", "airline"], default="retail")
+    parser.add_argument("--num-episodes", type=int, default=128)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    for compact_data in [False, True]:
+        queue = ctx.Queue()
+        process = ctx.Process(
+            target=_measure_in_process,
+            args=(queue, args.env, args.num_episodes, compact_data),
+        )
+        process.start()
+        result = queue.get()
+        process.join()
+        print(
+            f"{'compact' if compact_data else 'dicts'}: "
+            f"{result['data_mb']:.1f} MB for the first episode (data, tools and user), "
+            f"{result['per_episode_kb']:.0f} KB per additional episode, "
+            f"{result['total_mb']:.1f} MB for {args.num_episodes} episodes"
+        )
+
+
+if __name__ == "__main__":
+    main()
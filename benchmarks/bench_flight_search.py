@@ -0,0 +1,102 @@
+# Copyright Sierra
+
+"""Compare airline flight search on plain dict data vs. indexed copy-on-write data,
+with the flights as parsed from JSON or as a columnar `FlightInventory` (as with
+`--compact-data`).
+
+    python benchmarks/bench_flight_search.py
+"""
+
+import os
+import json
+import time
+import argparse
+import tracemalloc
+import itertools
+from typing import Any, Callable, Dict, List, Tuple
+
+from tau_bench.envs.airline.data import FOLDER_PATH, load_data
+from tau_bench.envs.airline.inventory import FlightInventory
+from tau_bench.envs.airline.tools import SearchDirectFlight, SearchOnestopFlight
+from tau_bench.envs.db import copy_on_write_loader
+
+
+def load_inventory_data() -> Dict[str, Any]:
+    data = load_data()
+    data["flights"] = FlightInventory(data["flights"])
+    return data
+
+
+def measure_flights_memory() -> Tuple[float, float]:
+    """MB allocated for the flights parsed from JSON, and for their inventory."""
+    tracemalloc.start()
+    with open(os.path.join(FOLDER_PATH, "flights.json")) as f:
+        flights = json.load(f)
+    json_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    tracemalloc.start()
+    inventory = FlightInventory(flights)
+    inventory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    del inventory
+    return json_mb, inventory_mb
+
+
+def get_queries(data: Dict[str, Any], num_dates: int) -> List[Tuple[str, str, str]]:
+    airports = sorted(
+        set(flight["origin"] for flight in data["flights"].values())
+        | set(flight["destination"] for flight in data["flights"].values())
+    )
+    dates = [f"2024-05-{day:02d}" for day in range(15, 15 + num_dates)]
+    return [
+        (origin, destination, date)
+        for origin, destination in itertools.permutations(airports, 2)
+        for date in dates
+    ]
+
+
+def time_queries(
+    invoke: Callable[..., str], data: Dict[str, Any], queries: List[Tuple[str, str, str]]
+) -> Tuple[float, List[str]]:
+    outputs = []
+    start = time.perf_counter()
+    for origin, destination, date in queries:
+        try:
+            outputs.append(invoke(data, origin, destination, date))
+        except Exception as e:
+            outputs.append(f"Error: {e}")
+    return time.perf_counter() - start, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-dates", type=int, default=2)
+    args = parser.parse_args()
+
+    plain_data = load_data()
+    cow_data = copy_on_write_loader(load_data)()
+    inventory_data = copy_on_write_loader(load_inventory_data)()
+    queries = get_queries(plain_data, args.num_dates)
+    json_mb, inventory_mb = measure_flights_memory()
+    print(
+        f"{len(plain_data['flights'])} flights: {json_mb:.1f} MB as JSON dicts, "
+        f"{inventory_mb:.1f} MB as an inventory; {len(queries)} queries per tool"
+    )
+    for tool in [SearchDirectFlight, SearchOnestopFlight]:
+        name = tool.get_info()["function"]["name"]
+        plain_time, plain_outputs = time_queries(tool.invoke, plain_data, queries)
+        cow_time, cow_outputs = time_queries(tool.invoke, cow_data, queries)
+        inventory_time, inventory_outputs = time_queries(tool.invoke, inventory_data, queries)
+        assert plain_outputs == cow_outputs, f"{name}: indexed results differ"
+        assert plain_outputs == inventory_outputs, f"{name}: inventory results differ"
+        print(
+            f"{name}: scan {plain_time * 1000 / len(queries):.3f} ms/query, "
+            f"indexed {cow_time * 1000 / len(queries):.3f} ms/query "
+            f"({plain_time / cow_time:.1f}x), "
+            f"indexed inventory {inventory_time * 1000 / len(queries):.3f} ms/query "
+            f"({plain_time / inventory_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
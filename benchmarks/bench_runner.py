@@ -0,0 +1,158 @@
+# Copyright Sierra
+
+"""Measure the runner's own throughput and overhead against the mock LLM server.
+
+Starts `mock_llm_server.py` in a subprocess, runs `tau_bench.run.run` against it
+at each `--max-concurrency` and reports tasks/sec, CPU time per task, peak RSS
+and the mean time per task of each traced phase. `harness` is the episode time
+not spent waiting on the agent or user model, i.e. the runner's own overhead.
+
+    python benchmarks/bench_runner.py --max-concurrency 1 8 32 --num-tasks 32 --latency-dist lognormal --latency-mean-ms 200
+"""
+
+import os
+import io
+import time
+import socket
+import argparse
+import tempfile
+import resource
+import multiprocessing
+from contextlib import redirect_stdout
+from typing import Any, Dict, List
+
+from mock_llm_server import add_server_args, config_from_args, serve
+from tau_bench.run import run
+from tau_bench.tracing import AGENT_LLM, EPISODE, USER_LLM, summarize_traces
+from tau_bench.types import EnvRunResult, RunConfig
+
+
+def _serve(args: argparse.Namespace, port: int) -> None:
+    serve(config_from_args(args), port=port).serve_forever()
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def phase_times(results: List[EnvRunResult]) -> Dict[str, float]:
+    """Mean seconds per task spent in each phase."""
+    traces = [r.info["trace"] for r in results if "trace" in r.info]
+    totals = {name: stats["total"] for name, stats in summarize_traces(traces).items()}
+    totals["harness"] = sum(harness_time(trace["spans"]) for trace in traces)
+    return {name: total / max(len(traces), 1) for name, total in totals.items()}
+
+
+def harness_time(spans: List[Dict[str, Any]]) -> float:
+    """Time of the episode span not spent in model calls made within it."""
+    episodes = [s for s in spans if s["name"] == EPISODE]
+    if len(episodes) == 0:
+        return 0.0
+    episode = episodes[0]
+    end = episode["start"] + episode["duration"]
+    waiting = sum(
+        s["duration"]
+        for s in spans
+        if s["name"] in [AGENT_LLM, USER_LLM] and episode["start"] <= s["start"] <= end
+    )
+    return episode["duration"] - waiting
+
+
+def bench(config: RunConfig) -> Dict[str, Any]:
+    cpu_start = cpu_time()
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        results = run(config)
+    elapsed = time.perf_counter() - start
+    num_tasks = len(results)
+    return {
+        "num_tasks": num_tasks,
+        "errors": sum(1 for r in results if "error" in r.info),
+        "tasks_per_sec": num_tasks / elapsed,
+        "cpu_ms_per_task": (cpu_time() - cpu_start) / max(num_tasks, 1) * 1000,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "phases_ms": {name: t * 1000 for name, t in phase_times(results).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", type=str, default="retail", choices=["retail", "airline"])
+    parser.add_argument("--agent-strategy", type=str, default="tool-calling", choices=["tool-calling", "act", "react"])
+    parser.add_argument("--runtime", type=str, default="thread", choices=["thread", "async"])
+    parser.add_argument("--num-tasks", type=int, default=16)
+    parser.add_argument("--max-concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Treat each --max-concurrency as the upper bound of an adaptive limit",
+    )
+    add_server_args(parser)
+    args = parser.parse_args()
+
+    port = get_free_port()
+    server = multiprocessing.Process(target=_serve, args=(args, port), daemon=True)
+    server.start()
+    wait_for_port(port)
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "EMPTY")
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        base_config = RunConfig(
+            model_provider="openai",
+            user_model_provider="openai",
+            model="mock",
+            user_model="mock",
+            env=args.env,
+            agent_strategy=args.agent_strategy,
+            runtime=args.runtime,
+            num_shards=args.num_shards,
+            adaptive_concurrency=args.adaptive_concurrency,
+            log_dir=log_dir,
+        )
+        # warm up imports, data loading and connections
+        bench(base_config.model_copy(update={"end_index": 1, "run_name": "warmup"}))
+        for max_concurrency in args.max_concurrency:
+            stats = bench(
+                base_config.model_copy(
+                    update={
+                        "end_index": args.num_tasks,
+                        "max_concurrency": max_concurrency,
+                        "run_name": f"c{max_concurrency}",
+                    }
+                )
+            )
+            phases = " ".join(f"{name}={t:.1f}" for name, t in stats["phases_ms"].items())
+            print(
+                f"max_concurrency={max_concurrency}: {stats['num_tasks']} tasks "
+                f"({stats['errors']} errors), {stats['tasks_per_sec']:.2f} tasks/s, "
+                f"{stats['cpu_ms_per_task']:.1f} ms CPU/task, max RSS {stats['max_rss_mb']:.0f} MB"
+            )
+            print(f"  ms per task: {phases}")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# Copyright Sierra
+
+"""A stand-in OpenAI-compatible chat completions server for benchmarking the runner.
+
+Agents (requests with tools) make `--tool-calls-per-turn` tool calls and then
+reply to the user; the simulated user stops the conversation after `--turns`
+replies. Every response is delayed according to the configured latency
+distribution, so runs take about as long as with a real server without
+needing one. `--capacity` slows responses down in proportion to the requests
+in flight beyond it, `--max-in-flight` rejects requests beyond it with a 429,
+like an overloaded server, and `--error-rate` fails a fraction of requests
+with a 503.
+
+    python benchmarks/mock_llm_server.py --port 8001 --latency-dist lognormal --latency-mean-ms 500
+    OPENAI_API_BASE=http://localhost:8001/v1 OPENAI_API_KEY=EMPTY python run.py --model mock --model-provider openai --user-model mock --user-model-provider openai ...
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# read-only tools preferred by the scripted agent, with their arguments
+SCRIPTED_TOOLS = [
+    ("list_all_product_types", {}),
+    ("list_all_airports", {}),
+    ("think", {"thought": "Let me check the details before answering."}),
+]
+
+
+class MockLLMConfig(object):
+    def __init__(
+        self,
+        latency_dist: str = "constant",
+        latency_mean_ms: float = 0.0,
+        latency_sigma: float = 0.5,
+        tool_calls_per_turn: int = 2,
+        turns: int = 3,
+        capacity: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        assert latency_dist in ["constant", "uniform", "exponential", "lognormal"]
+        self.latency_dist = latency_dist
+        self.latency_mean_ms = latency_mean_ms
+        self.latency_sigma = latency_sigma
+        self.tool_calls_per_turn = tool_calls_per_turn
+        self.turns = turns
+        self.capacity = capacity
+        self.max_in_flight = max_in_flight
+        self.error_rate = error_rate
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def sample_latency(self) -> float:
+        mean = self.latency_mean_ms / 1000
+        with self._random_lock:
+            if self.latency_dist == "constant":
+                return mean
+            elif self.latency_dist == "uniform":
+                return self._random.uniform(0, 2 * mean)
+            elif self.latency_dist == "exponential":
+                return self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            # lognormal with the given mean
+            mu = math.log(mean) - self.latency_sigma**2 / 2 if mean > 0 else 0.0
+            return self._random.lognormvariate(mu, self.latency_sigma) if mean > 0 else 0.0
+
+    def enter(self) -> Optional[int]:
+        """Admit a request, returning the requests in flight or None if rejected."""
+        with self._random_lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return None
+            self.in_flight += 1
+            return self.in_flight
+
+    def fail(self) -> bool:
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def exit(self) -> None:
+        with self._random_lock:
+            self.in_flight -= 1
+
+    def next_id(self) -> str:
+        return f"call_{next(self._ids)}"
+
+
+def agent_message(config: MockLLMConfig, request: Dict[str, Any]) -> Dict[str, Any]:
+    messages = request["messages"]
+    num_tool_calls = 0
+    for message in reversed(messages):
+        if message["role"] == "user":
+            break
+        if message["role"] == "tool":
+            num_tool_calls += 1
+    if num_tool_calls < config.tool_calls_per_turn:
+        names = set(tool["function"]["name"] for tool in request["tools"])
+        name, arguments = next(
+            ((n, a) for n, a in SCRIPTED_TOOLS if n in names),
+            (request["tools"][0]["function"]["name"], {}),
+        )
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": config.next_id(),
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(arguments)},
+                }
+            ],
+        }
+    return {"role": "assistant", "content": "I have looked into it. Is there anything else?"}
+
+
+def react_message(config: MockLLMConfig, request: Dict[str, Any]) -> Dict[str, Any]:
+    action = {"name": "respond", "arguments": {"content": "How can I help you today?"}}
+    return {
+        "role": "assistant",
+        "content": f"Thought:\nI should reply to the user.\nAction:\n{json.dumps(action)}",
+    }
+
+
+def user_message(config: MockLLMConfig, request: Dict[str, Any]) -> Dict[str, Any]:
+    num_replies = sum(1 for m in request["messages"] if m["role"] == "assistant")
+    if num_replies >= config.turns:
+        return {"role": "assistant", "content": "Thanks, that is all. ###STOP###"}
+    return {"role": "assistant", "content": "Hi, I need help with one of my orders."}
+
+
+def respond(config: MockLLMConfig, request: Dict[str, Any]) -> Dict[str, Any]:
+    messages: List[Dict[str, Any]] = request["messages"]
+    if request.get("tools"):
+        message = agent_message(config, request)
+    elif "#Available tools" in (messages[0].get("content") or ""):
+        message = react_message(config, request)
+    else:
+        message = user_message(config, request)
+    prompt_tokens = sum(len(json.dumps(m)) for m in messages) // 4
+    completion_tokens = len(json.dumps(message)) // 4
+    return {
+        "id": f"chatcmpl-{config.next_id()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def make_handler(config: MockLLMConfig) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            in_flight = config.enter()
+            if in_flight is None:
+                self.send_json(429, {"error": {"message": "Too many requests", "type": "rate_limit_error"}})
+                return
+            if config.fail():
+                config.exit()
+                self.send_json(503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+                return
+            try:
+                response = respond(config, json.loads(body))
+                latency = config.sample_latency()
+                if config.capacity is not None:
+                    latency *= max(1.0, in_flight / config.capacity)
+                time.sleep(latency)
+            finally:
+                config.exit()
+            self.send_json(200, response)
+
+        def send_json(self, status: int, response: Dict[str, Any]) -> None:
+            data = json.dumps(response).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections from many concurrent episodes
+    request_queue_size = 1024
+
+
+def serve(config: MockLLMConfig, host: str = "127.0.0.1", port: int = 8001) -> ThreadingHTTPServer:
+    return MockLLMServer((host, port), make_handler(config))
+
+
+def add_server_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--latency-dist",
+        type=str,
+        default="constant",
+        choices=["constant", "uniform", "exponential", "lognormal"],
+    )
+    parser.add_argument("--latency-mean-ms", type=float, default=0.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma of the lognormal distribution")
+    parser.add_argument("--tool-calls-per-turn", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=3, help="Number of user replies before the user stops")
+    parser.add_argument("--capacity", type=int, default=None, help="Requests in flight beyond which latency grows proportionally")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Requests in flight beyond which requests get a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with a 503")
+
+
+def config_from_args(args: argparse.Namespace, seed: Optional[int] = None) -> MockLLMConfig:
+    return MockLLMConfig(
+        latency_dist=args.latency_dist,
+        latency_mean_ms=args.latency_mean_ms,
+        latency_sigma=args.latency_sigma,
+        tool_calls_per_turn=args.tool_calls_per_turn,
+        turns=args.turns,
+        capacity=args.capacity,
+        max_in_flight=args.max_in_flight,
+        error_rate=args.error_rate,
+        seed=seed if seed is not None else 0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_server_args(parser)
+    args = parser.parse_args()
+    server = serve(config_from_args(args), args.host, args.port)
+    print(f"Serving mock chat completions on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
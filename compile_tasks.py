@@ -0,0 +1,33 @@
+# Copyright Sierra
+
+import argparse
+from tau_bench.envs.task_store import TASK_MODULES, compile_tasks
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--env", type=str, choices=list(TASK_MODULES.keys()), default="retail"
+    )
+    parser.add_argument(
+        "--task-split",
+        type=str,
+        nargs="+",
+        help="The splits to compile (default: all splits of the env)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    task_splits = args.task_split or list(TASK_MODULES[args.env])
+    for task_split in task_splits:
+        if task_split not in TASK_MODULES[args.env]:
+            raise ValueError(f"Unknown task split for {args.env}: {task_split}")
+    for task_split in task_splits:
+        path = compile_tasks(args.env, task_split)
+        print(f"Tasks of {args.env} ({task_split}) compiled to {path}")
+
+
+if __name__ == "__main__":
+    main()
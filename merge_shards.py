@@ -0,0 +1,37 @@
+# Copyright Sierra
+
+import argparse
+from tau_bench.checkpoint import merge_shards
+from tau_bench.run import display_latency, display_metrics
+from tau_bench.types import EnvRunResult
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "shard_paths",
+        type=str,
+        nargs="+",
+        help="The shard files written by `run.py --shard-index`, e.g. results/<run>.shard-*.jsonl",
+    )
+    parser.add_argument(
+        "--output-path", type=str, required=True, help="Path to the merged checkpoint file"
+    )
+    parser.add_argument(
+        "--trace-path",
+        type=str,
+        help="(Optional) write the latency spans of every episode to this file in Chrome trace format",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = [EnvRunResult(**r) for r in merge_shards(args.shard_paths, args.output_path)]
+    display_metrics(results)
+    display_latency(results, args.trace_path)
+    print(f"\n📄 Results saved to {args.output_path}\n")
+
+
+if __name__ == "__main__":
+    main()
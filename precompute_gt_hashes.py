@@ -0,0 +1,32 @@
+# Copyright Sierra
+
+import argparse
+from tau_bench.envs.gt_hashes import TASK_SPLITS, save_gt_hashes
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--env", type=str, choices=list(TASK_SPLITS.keys()), default="retail"
+    )
+    parser.add_argument(
+        "--task-split",
+        type=str,
+        nargs="+",
+        help="The splits to precompute (default: all splits of the env)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    task_splits = args.task_split or TASK_SPLITS[args.env]
+    for task_split in task_splits:
+        if task_split not in TASK_SPLITS[args.env]:
+            raise ValueError(f"Unknown task split for {args.env}: {task_split}")
+    path = save_gt_hashes(args.env, task_splits)
+    print(f"Ground-truth hashes saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -63,12 +63,139 @@ def parse_args() -> RunConfig:
         "--max-concurrency",
         type=int,
         default=1,
-        help="Number of tasks to run in parallel",
+        help="Number of tasks to run in parallel (the upper bound with --adaptive-concurrency)",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Adjust the number of tasks run in parallel between --min-concurrency and --max-concurrency based on model latency and rate limit errors",
+    )
+    parser.add_argument("--min-concurrency", type=int, default=1)
+    parser.add_argument(
+        "--concurrency-log-path",
+        type=str,
+        default=None,
+        help="Where to save the trajectory of the adaptive concurrency limit (defaults to next to the checkpoint)",
     )
     parser.add_argument("--seed", type=int, default=10)
     parser.add_argument("--shuffle", type=int, default=0)
     parser.add_argument("--user-strategy", type=str, default="llm", choices=[item.value for item in UserStrategy])
     parser.add_argument("--few-shot-displays-path", type=str, help="Path to a jsonlines file containing few shot displays")
+    parser.add_argument(
+        "--runtime",
+        type=str,
+        default="thread",
+        choices=["thread", "async"],
+        help="Run tasks on a thread pool, or as coroutines on a single event loop (max concurrency bounds the in-flight tasks)",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the (task, trial) pairs across this many worker processes; max concurrency applies per shard",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        help="(Optional) run only this shard, e.g. one per host, and merge the shard files with merge_shards.py afterwards",
+    )
+    parser.add_argument(
+        "--run-name",
+        type=str,
+        help="(Optional) suffix of the checkpoint file name instead of a timestamp; use the same value on every host of a sharded run",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        help="(Optional) path to the checkpoint (.json or .jsonl) of an interrupted run; only the missing or failed (task, trial) pairs are run and appended to it",
+    )
+    parser.add_argument(
+        "--trace-path",
+        type=str,
+        help="(Optional) write the per-phase latency spans of every episode to this file in Chrome trace format (open in chrome://tracing or ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        help="(Optional) tokenizer used to fit conversations in the context window: tiktoken:<encoding or model> or the path to a Hugging Face tokenizer.json; defaults to a character-based estimate",
+    )
+    parser.add_argument(
+        "--max-context-length",
+        type=int,
+        help="(Optional) context length of the served models, e.g. vLLM's --max-model-len (default: 4096)",
+    )
+    parser.add_argument(
+        "--context-mode",
+        type=str,
+        default="truncate",
+        choices=["truncate", "prefix-stable"],
+        help="How agents fit long conversations in the context window: drop the oldest messages (truncate), or keep the start of the conversation and elide older messages in chunks so that servers with prefix caching can reuse the prompt prefix (prefix-stable)",
+    )
+    parser.add_argument(
+        "--llm-cache-path",
+        type=str,
+        help="(Optional) SQLite file caching the agent and user model responses across runs and processes",
+    )
+    parser.add_argument(
+        "--llm-cache-mode",
+        type=str,
+        default="read-write",
+        choices=["off", "read-write", "read-only", "replay"],
+        help="read-write: call the model on misses and store the responses; read-only: call the model on misses without storing them; replay: fail on misses",
+    )
+    parser.add_argument(
+        "--llm-cache-max-size-mb",
+        type=float,
+        help="(Optional) evict the least recently used responses beyond this size",
+    )
+    parser.add_argument(
+        "--llm-cache-max-age-days",
+        type=float,
+        help="(Optional) evict responses not used for this many days",
+    )
+    parser.add_argument(
+        "--llm-timeout",
+        type=float,
+        default=None,
+        help="Timeout in seconds of each agent and user model call",
+    )
+    parser.add_argument(
+        "--llm-max-retries",
+        type=int,
+        default=4,
+        help="Number of times a model call is retried after a rate limit, timeout or server error",
+    )
+    parser.add_argument(
+        "--coalesce-requests",
+        action="store_true",
+        help="Send identical temperature-0 model requests made by concurrent tasks once and share the response",
+    )
+    parser.add_argument(
+        "--llm-max-connections",
+        type=int,
+        default=None,
+        help="Share one pool of this many keep-alive HTTP connections between all model calls (e.g. --max-concurrency)",
+    )
+    parser.add_argument(
+        "--llm-http2",
+        action="store_true",
+        help="Use HTTP/2 for model calls to servers that support it (TLS only)",
+    )
+    parser.add_argument(
+        "--compact-data",
+        action="store_true",
+        help="Store the env database in a compact read-only form, to save memory in each process",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        help="(Optional) record every model response and tool observation of the run to this JSONL file",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        help="(Optional) replay a run recorded with --record, answering model calls from the recording instead of a model server",
+    )
     args = parser.parse_args()
     print(args)
     return RunConfig(
@@ -86,10 +213,34 @@ def parse_args() -> RunConfig:
         task_ids=args.task_ids,
         log_dir=args.log_dir,
         max_concurrency=args.max_concurrency,
+        adaptive_concurrency=args.adaptive_concurrency,
+        min_concurrency=args.min_concurrency,
+        concurrency_log_path=args.concurrency_log_path,
         seed=args.seed,
         shuffle=args.shuffle,
         user_strategy=args.user_strategy,
         few_shot_displays_path=args.few_shot_displays_path,
+        runtime=args.runtime,
+        num_shards=args.num_shards,
+        shard_index=args.shard_index,
+        run_name=args.run_name,
+        resume_path=args.resume,
+        trace_path=args.trace_path,
+        tokenizer=args.tokenizer,
+        max_context_length=args.max_context_length,
+        context_mode=args.context_mode,
+        llm_cache_path=args.llm_cache_path,
+        llm_cache_mode=args.llm_cache_mode,
+        llm_cache_max_size_mb=args.llm_cache_max_size_mb,
+        llm_cache_max_age_days=args.llm_cache_max_age_days,
+        llm_timeout=args.llm_timeout,
+        llm_max_retries=args.llm_max_retries,
+        coalesce_requests=args.coalesce_requests,
+        llm_max_connections=args.llm_max_connections,
+        llm_http2=args.llm_http2,
+        compact_data=args.compact_data,
+        record_path=args.record,
+        replay_path=args.replay,
     )
 
 
@@ -1,13 +1,16 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
+from tau_bench.llm import completion, acompletion
 
 from tau_bench.agents.base import Agent
-from tau_bench.token_utils import truncate_messages
+from tau_bench.token_utils import ContextWindow, truncate_messages
 from tau_bench.envs.base import Env
+from tau_bench.tracing import AGENT_LLM, record_usage, span
 from tau_bench.types import (
     Action,
+    EnvResetResponse,
+    EnvResponse,
     SolveResult,
     RESPOND_ACTION_NAME,
     RESPOND_ACTION_FIELD_NAME,
@@ -24,6 +27,7 @@ class ChatReActAgent(Agent):
         provider: str,
         use_reasoning: bool = True,
         temperature: float = 0.0,
+        context_mode: str = "truncate",
     ) -> None:
         instruction = REACT_INSTRUCTION if use_reasoning else ACT_INSTRUCTION
         self.prompt = (
@@ -34,17 +38,23 @@ class ChatReActAgent(Agent):
         self.temperature = temperature
         self.use_reasoning = use_reasoning
         self.tools_info = tools_info
+        self.context_mode = context_mode
 
     def generate_next_step(
-        self, messages: List[Dict[str, Any]]
+        self, messages: List[Dict[str, Any]], context: Optional[ContextWindow] = None
     ) -> Tuple[Dict[str, Any], Action, float]:
-        messages = truncate_messages(messages)
-        res = completion(
-            model=self.model,
-            custom_llm_provider=self.provider,
-            messages=messages,
-            temperature=self.temperature,
-        )
+        messages = truncate_messages(messages) if context is None else context.fit(messages)
+        with span(AGENT_LLM) as s:
+            res = completion(
+                model=self.model,
+                custom_llm_provider=self.provider,
+                messages=messages,
+                temperature=self.temperature,
+            )
+            record_usage(s, res)
+        return self.parse_step(res)
+
+    def parse_step(self, res: Any) -> Tuple[Dict[str, Any], Action, float]:
         message = res.choices[0].message
         action_str = message.content.split("Action:")[-1].strip()
         try:
@@ -60,38 +70,89 @@ class ChatReActAgent(Agent):
         action = Action(name=action_parsed["name"], kwargs=action_parsed["arguments"])
         return message.model_dump(), action, res._hidden_params["response_cost"]
 
+    async def agenerate_next_step(
+        self, messages: List[Dict[str, Any]], context: Optional[ContextWindow] = None
+    ) -> Tuple[Dict[str, Any], Action, float]:
+        messages = truncate_messages(messages) if context is None else context.fit(messages)
+        with span(AGENT_LLM) as s:
+            res = await acompletion(
+                model=self.model,
+                custom_llm_provider=self.provider,
+                messages=messages,
+                temperature=self.temperature,
+            )
+            record_usage(s, res)
+        return self.parse_step(res)
+
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
     ) -> SolveResult:
-        response = env.reset(task_index=task_index)
-        reward = 0.0
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": self.prompt},
-            {"role": "user", "content": response.observation},
-        ]
-        total_cost = 0.0
-        info = {}
+        episode = ChatReActEpisode(
+            self.prompt, env.reset(task_index=task_index), self.context_mode
+        )
+        for _ in range(max_num_steps):
+            message, action, cost = self.generate_next_step(
+                episode.messages, episode.context
+            )
+            if episode.add_step(message, action, cost, env.step(action)):
+                break
+        return episode.result()
+
+    async def asolve(
+        self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
+    ) -> SolveResult:
+        episode = ChatReActEpisode(
+            self.prompt, await env.areset(task_index=task_index), self.context_mode
+        )
         for _ in range(max_num_steps):
-            message, action, cost = self.generate_next_step(messages)
-            response = env.step(action)
-            obs = response.observation
-            reward = response.reward
-            info = {**info, **response.info.model_dump()}
-            if action.name != RESPOND_ACTION_NAME:
-                obs = "API output: " + obs
-            messages.extend(
-                [
-                    message,
-                    {"role": "user", "content": obs},
-                ]
+            message, action, cost = await self.agenerate_next_step(
+                episode.messages, episode.context
             )
-            total_cost += cost
-            if response.done:
+            if episode.add_step(message, action, cost, await env.astep(action)):
                 break
+        return episode.result()
+
+
+class ChatReActEpisode(object):
+    """The messages and results of an episode of a ReAct agent, shared by its
+    `solve` and `asolve`."""
+
+    def __init__(
+        self, prompt: str, env_reset_res: EnvResetResponse, context_mode: str
+    ) -> None:
+        self.messages: List[Dict[str, Any]] = [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": env_reset_res.observation},
+        ]
+        self.reward = 0.0
+        self.total_cost = 0.0
+        self.info: Dict[str, Any] = {}
+        self.context = ContextWindow(mode=context_mode)
+
+    def add_step(
+        self, message: Dict[str, Any], action: Action, cost: float, response: EnvResponse
+    ) -> bool:
+        """Returns whether the episode is done."""
+        obs = response.observation
+        self.reward = response.reward
+        self.info = {**self.info, **response.info.model_dump()}
+        if action.name != RESPOND_ACTION_NAME:
+            obs = "API output: " + obs
+        self.messages.extend(
+            [
+                message,
+                {"role": "user", "content": obs},
+            ]
+        )
+        self.total_cost += cost
+        return response.done
+
+    def result(self) -> SolveResult:
+        self.info["context"] = self.context.summary()
         return SolveResult(
-            messages=messages,
-            reward=reward,
-            info=info,
+            messages=self.messages,
+            reward=self.reward,
+            info=self.info,
         )
 
 
@@ -1,13 +1,20 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
+from tau_bench.llm import completion, acompletion
 from typing import List, Optional, Dict, Any
 
 from tau_bench.agents.base import Agent
-from tau_bench.token_utils import truncate_messages
+from tau_bench.token_utils import ContextWindow
 from tau_bench.envs.base import Env
-from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
+from tau_bench.tracing import AGENT_LLM, record_usage, span
+from tau_bench.types import (
+    SolveResult,
+    Action,
+    EnvResetResponse,
+    EnvResponse,
+    RESPOND_ACTION_NAME,
+)
 
 
 class ToolCallingAgent(Agent):
@@ -18,67 +25,114 @@ class ToolCallingAgent(Agent):
         model: str,
         provider: str,
         temperature: float = 0.0,
+        context_mode: str = "truncate",
     ):
         self.tools_info = tools_info
         self.wiki = wiki
         self.model = model
         self.provider = provider
         self.temperature = temperature
+        self.context_mode = context_mode
 
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
     ) -> SolveResult:
-        total_cost = 0.0
-        env_reset_res = env.reset(task_index=task_index)
-        obs = env_reset_res.observation
-        info = env_reset_res.info.model_dump()
-        reward = 0.0
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": self.wiki},
-            {"role": "user", "content": obs},
-        ]
+        episode = self.start_episode(env.reset(task_index=task_index))
         for _ in range(max_num_steps):
-            messages = truncate_messages(messages, tools=self.tools_info)
-            res = completion(
-                messages=messages,
-                model=self.model,
-                custom_llm_provider=self.provider,
-                tools=self.tools_info,
-                temperature=self.temperature,
-            )
-            next_message = res.choices[0].message.model_dump()
-            total_cost += res._hidden_params["response_cost"] or 0
-            action = message_to_action(next_message)
-            env_response = env.step(action)
-            reward = env_response.reward
-            info = {**info, **env_response.info.model_dump()}
-            if action.name != RESPOND_ACTION_NAME:
-                next_message["tool_calls"] = next_message["tool_calls"][:1]
-                messages.extend(
-                    [
-                        next_message,
-                        {
-                            "role": "tool",
-                            "tool_call_id": next_message["tool_calls"][0]["id"],
-                            "name": next_message["tool_calls"][0]["function"]["name"],
-                            "content": env_response.observation,
-                        },
-                    ]
-                )
-            else:
-                messages.extend(
-                    [
-                        next_message,
-                        {"role": "user", "content": env_response.observation},
-                    ]
-                )
-            if env_response.done:
+            with span(AGENT_LLM) as s:
+                res = completion(**episode.next_request())
+                record_usage(s, res)
+            env_response = env.step(episode.add_response(res))
+            if episode.add_env_response(env_response):
+                break
+        return episode.result()
+
+    async def asolve(
+        self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 30
+    ) -> SolveResult:
+        episode = self.start_episode(await env.areset(task_index=task_index))
+        for _ in range(max_num_steps):
+            with span(AGENT_LLM) as s:
+                res = await acompletion(**episode.next_request())
+                record_usage(s, res)
+            env_response = await env.astep(episode.add_response(res))
+            if episode.add_env_response(env_response):
                 break
+        return episode.result()
+
+    def start_episode(self, env_reset_res: EnvResetResponse) -> "ToolCallingEpisode":
+        return ToolCallingEpisode(self, self.wiki, env_reset_res)
+
+
+class ToolCallingEpisode(object):
+    """The messages and results of an episode of a tool calling agent, shared
+    by its `solve` and `asolve`."""
+
+    def __init__(
+        self, agent: ToolCallingAgent, system_prompt: str, env_reset_res: EnvResetResponse
+    ) -> None:
+        self.agent = agent
+        self.messages: List[Dict[str, Any]] = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": env_reset_res.observation},
+        ]
+        self.info = env_reset_res.info.model_dump()
+        self.reward = 0.0
+        self.total_cost = 0.0
+        self.context = ContextWindow(tools=agent.tools_info, mode=agent.context_mode)
+        self.next_message: Dict[str, Any] = {}
+        self.action: Optional[Action] = None
+
+    def next_request(self) -> Dict[str, Any]:
+        self.messages = self.context.fit(self.messages)
+        return dict(
+            messages=self.messages,
+            model=self.agent.model,
+            custom_llm_provider=self.agent.provider,
+            tools=self.agent.tools_info,
+            temperature=self.agent.temperature,
+        )
+
+    def add_response(self, res: Any) -> Action:
+        self.next_message = res.choices[0].message.model_dump()
+        self.total_cost += res._hidden_params["response_cost"] or 0
+        self.action = message_to_action(self.next_message)
+        return self.action
+
+    def add_env_response(self, env_response: EnvResponse) -> bool:
+        """Returns whether the episode is done."""
+        next_message = self.next_message
+        self.reward = env_response.reward
+        self.info = {**self.info, **env_response.info.model_dump()}
+        if self.action.name != RESPOND_ACTION_NAME:
+            next_message["tool_calls"] = next_message["tool_calls"][:1]
+            self.messages.extend(
+                [
+                    next_message,
+                    {
+                        "role": "tool",
+                        "tool_call_id": next_message["tool_calls"][0]["id"],
+                        "name": next_message["tool_calls"][0]["function"]["name"],
+                        "content": env_response.observation,
+                    },
+                ]
+            )
+        else:
+            self.messages.extend(
+                [
+                    next_message,
+                    {"role": "user", "content": env_response.observation},
+                ]
+            )
+        return env_response.done
+
+    def result(self) -> SolveResult:
+        self.info["context"] = self.context.summary()
         return SolveResult(
-            reward=reward,
-            info=info,
-            messages=messages,
-            total_cost=total_cost,
+            reward=self.reward,
+            info=self.info,
+            messages=self.messages,
+            total_cost=self.total_cost,
         )
 
 
@@ -0,0 +1,154 @@
+# Copyright Sierra
+
+import os
+import json
+import queue
+import threading
+from typing import IO, List, Dict, Any, Optional, Tuple
+
+
+def get_stream_path(ckpt_path: str) -> str:
+    return os.path.splitext(ckpt_path)[0] + ".jsonl"
+
+
+def get_shard_path(ckpt_path: str, shard_index: int, num_shards: int) -> str:
+    """Path of the JSONL stream written by one shard of a sharded run."""
+    return os.path.splitext(ckpt_path)[0] + f".shard-{shard_index}-of-{num_shards}.jsonl"
+
+
+def load_checkpoint(path: str) -> List[Dict[str, Any]]:
+    """Load results from either a JSON array checkpoint or a JSONL stream."""
+    if not os.path.exists(path):
+        return []
+    if path.endswith(".jsonl"):
+        results = []
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a partially written line from an interrupted run
+                    continue
+        return results
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_resumable_results(ckpt_path: str) -> List[Dict[str, Any]]:
+    """Load the finished results of a previous run of `ckpt_path`.
+
+    Reads the JSONL stream if it exists (the JSON array is only written when a
+    run completes), keeps the latest result per (task_id, trial), and drops
+    results that ended in an error so that they are run again.
+    """
+    stream_path = get_stream_path(ckpt_path)
+    path = stream_path if os.path.exists(stream_path) else ckpt_path
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No checkpoint found at {ckpt_path} or {stream_path}")
+    latest: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for result in load_checkpoint(path):
+        latest[(result["task_id"], result["trial"])] = result
+    return [result for result in latest.values() if "error" not in result["info"]]
+
+
+def write_checkpoint(ckpt_path: str, results: List[Dict[str, Any]]) -> None:
+    tmp_path = ckpt_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, ckpt_path)
+
+
+def merge_shards(shard_paths: List[str], ckpt_path: str) -> List[Dict[str, Any]]:
+    """Merge shard streams into the canonical JSON checkpoint at `ckpt_path`."""
+    results = []
+    for shard_path in shard_paths:
+        if not os.path.exists(shard_path):
+            raise FileNotFoundError(f"Missing shard results: {shard_path}")
+        results.extend(load_checkpoint(shard_path))
+    results.sort(key=lambda r: (r["trial"], r["task_id"]))
+    write_checkpoint(ckpt_path, results)
+    return results
+
+
+class CheckpointWriter(object):
+    """Appends results to a JSONL stream from a background thread.
+
+    Workers only pay for a queue put; serialization and disk I/O happen on the
+    writer thread. `compact` rewrites the stream as the JSON array that
+    existing consumers of the checkpoint file expect. With `truncate`, results
+    left in the stream by an earlier run are discarded instead of appended to.
+    """
+
+    _STOP = object()
+
+    def __init__(self, ckpt_path: str, truncate: bool = False) -> None:
+        self.ckpt_path = ckpt_path
+        self.stream_path = get_stream_path(ckpt_path)
+        self.truncate = truncate
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._write_loop, name="checkpoint-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, result: Dict[str, Any]) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put(result)
+
+    def _open_stream(self) -> IO[str]:
+        f = open(self.stream_path, "w" if self.truncate else "a+")
+        try:
+            # terminate a partial line left by an interrupted run before appending
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != "\n":
+                    f.write("\n")
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    def _write_loop(self) -> None:
+        try:
+            f = self._open_stream()
+        except BaseException as e:
+            # raised by the next `write` or `close`
+            self._error = e
+            return
+        with f:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                try:
+                    f.write(json.dumps(item) + "\n")
+                    f.flush()
+                except BaseException as e:
+                    self._error = e
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def compact(
+        self, results: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        self.close()
+        if results is None:
+            results = load_checkpoint(self.stream_path)
+        write_checkpoint(self.ckpt_path, results)
+        return results
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
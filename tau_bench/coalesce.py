@@ -0,0 +1,123 @@
+# Copyright Sierra
+
+"""Coalescing of identical model requests made by concurrent episodes.
+
+When several episodes send the same deterministic request (temperature 0) at
+the same time, e.g. the first turns of the trials of a task, only the first
+one is sent to the model server and the others wait for and share its
+response. Shared responses are copies with a cost of 0, so the run's cost is
+counted once.
+
+Requests that differ are not held back to be sent together: the chat
+completions API has no batch form, and a server with continuous batching
+(e.g. vLLM) already batches the requests that are in flight together.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from litellm import ModelResponse
+
+from tau_bench.llm_cache import hash_request
+
+
+class _InflightRequest(object):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _share(res: Any) -> Any:
+    if not isinstance(res, ModelResponse):
+        return res
+    shared = ModelResponse(**res.model_dump())
+    shared._hidden_params["response_cost"] = 0.0
+    shared._hidden_params["coalesced"] = True
+    return shared
+
+
+class RequestCoalescer(object):
+    def __init__(self) -> None:
+        self.num_sent = 0
+        self.num_coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _InflightRequest] = {}
+        self._ainflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+    def key(self, request: Dict[str, Any]) -> Optional[str]:
+        # sampled requests must get independent samples
+        if request.get("temperature") != 0:
+            return None
+        return hash_request(request)
+
+    def call(self, request: Dict[str, Any], call: Callable[..., Any]) -> Any:
+        key = self.key(request)
+        if key is None:
+            with self._lock:
+                self.num_sent += 1
+            return call(**request)
+        with self._lock:
+            inflight = self._inflight.get(key)
+            is_leader = inflight is None
+            if is_leader:
+                inflight = self._inflight[key] = _InflightRequest()
+                self.num_sent += 1
+            else:
+                self.num_coalesced += 1
+        if not is_leader:
+            inflight.done.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return _share(inflight.result)
+        try:
+            inflight.result = call(**request)
+        except BaseException as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            inflight.done.set()
+        return inflight.result
+
+    async def acall(
+        self, request: Dict[str, Any], call: Callable[..., Awaitable[Any]]
+    ) -> Any:
+        key = self.key(request)
+        if key is None:
+            with self._lock:
+                self.num_sent += 1
+            return await call(**request)
+        with self._lock:
+            future = self._ainflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._ainflight[key] = asyncio.get_running_loop().create_future()
+                self.num_sent += 1
+            else:
+                self.num_coalesced += 1
+        if not is_leader:
+            # a cancelled follower must not cancel the leader's request
+            return _share(await asyncio.shield(future))
+        try:
+            res = await call(**request)
+        except BaseException as e:
+            with self._lock:
+                del self._ainflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # followers may all have been cancelled
+                future.exception()
+            raise
+        with self._lock:
+            del self._ainflight[key]
+        future.set_result(res)
+        return res
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sent": self.num_sent, "coalesced": self.num_coalesced}
@@ -0,0 +1,199 @@
+# Copyright Sierra
+
+"""An adaptive limit on the number of episodes run at once.
+
+The runner holds a slot of an `AdaptiveLimiter` for each running episode, and
+every agent and user model call reports its latency and whether it failed with
+a rate limit, timeout or overloaded server (see `tau_bench/llm.py`). After
+each window of about `limit` calls the limit is adjusted AIMD-style:
+
+- a congestion error, or a window latency above `latency_tolerance` times the
+  lowest recent window latency of the same model, cuts the limit by
+  `decrease_factor`
+- otherwise, if the limit was reached during the window, it grows by one
+  (doubling until the first cut, like TCP slow start)
+"""
+
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+# per-window growth of the latency baselines, so that they follow latency
+# increases that are not caused by load (e.g. longer prompts)
+BASELINE_DRIFT = 0.01
+
+
+def _wake(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter(object):
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        initial_limit: Optional[int] = None,
+        latency_tolerance: float = 1.5,
+        decrease_factor: float = 0.75,
+        verbose: bool = True,
+    ) -> None:
+        assert 1 <= min_limit <= max_limit, "Invalid concurrency bounds"
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = min(max(initial_limit or min_limit, min_limit), max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.verbose = verbose
+        self.in_flight = 0
+        self.slow_start = True
+        self.start_time = time.time()
+        self._last_decrease = self.start_time
+        self.trajectory: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+        self._baseline_latency: Dict[str, float] = {}
+        self._reset_window()
+        self._log("start")
+
+    def _reset_window(self) -> None:
+        self._window_latencies: Dict[str, List[float]] = {}
+        self._window_samples = 0
+        self._window_errors = 0
+        self._window_max_in_flight = self.in_flight
+
+    def _log(self, reason: str, latency_ratio: Optional[float] = None) -> None:
+        self.trajectory.append(
+            {
+                "time": time.time() - self.start_time,
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "latency_ratio": latency_ratio,
+                "errors": self._window_errors,
+                "reason": reason,
+            }
+        )
+
+    def _set_limit_locked(
+        self, limit: int, reason: str, latency_ratio: Optional[float] = None
+    ) -> None:
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if limit == self.limit:
+            return
+        if self.verbose:
+            print(f"⚖️ Concurrency limit {self.limit} -> {limit} ({reason})")
+        self.limit = limit
+        self._log(reason, latency_ratio)
+        self._wake_locked()
+
+    def _decrease_locked(self, reason: str, latency_ratio: Optional[float] = None) -> None:
+        self.slow_start = False
+        self._last_decrease = time.time()
+        self._set_limit_locked(int(self.limit * self.decrease_factor), reason, latency_ratio)
+        self._reset_window()
+
+    def _wake_locked(self) -> None:
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _enter_locked(self) -> None:
+        self.in_flight += 1
+        self._window_max_in_flight = max(self._window_max_in_flight, self.in_flight)
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self._enter_locked()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < self.limit:
+                    self._enter_locked()
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._wake_locked()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def observe(self, model: str, latency: float, congested: bool = False) -> None:
+        """Report a model call that took `latency` seconds."""
+        with self._cond:
+            # until the episodes started under the old limit have drained, or
+            # for calls sent before the last cut, the old limit is measured
+            if self.in_flight > self.limit or time.time() - latency < self._last_decrease:
+                return
+            self._window_samples += 1
+            if congested:
+                self._window_errors += 1
+                self._decrease_locked("congestion error")
+                return
+            self._window_latencies.setdefault(model, []).append(latency)
+            if self._window_samples < self.limit:
+                return
+            latency_ratio = 0.0
+            for window_model, latencies in self._window_latencies.items():
+                window_latency = sum(latencies) / len(latencies)
+                baseline = self._baseline_latency.get(window_model, window_latency)
+                latency_ratio = max(latency_ratio, window_latency / baseline)
+                self._baseline_latency[window_model] = min(
+                    baseline * (1 + BASELINE_DRIFT), window_latency
+                )
+            if latency_ratio > self.latency_tolerance:
+                self._decrease_locked("latency", latency_ratio)
+            elif self._window_max_in_flight >= self.limit:
+                self._set_limit_locked(
+                    self.limit * 2 if self.slow_start else self.limit + 1,
+                    "slow start" if self.slow_start else "increase",
+                    latency_ratio,
+                )
+            self._reset_window()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._cond:
+            limits = [entry["limit"] for entry in self.trajectory]
+            return {
+                "limit": self.limit,
+                "min_limit_reached": min(limits),
+                "max_limit_reached": max(limits),
+                "num_changes": len(self.trajectory) - 1,
+                "trajectory": list(self.trajectory),
+            }
+
+
+_limiter: Optional[AdaptiveLimiter] = None
+
+
+def set_concurrency_limiter(limiter: Optional[AdaptiveLimiter]) -> None:
+    global _limiter
+    _limiter = limiter
+
+
+def get_concurrency_limiter() -> Optional[AdaptiveLimiter]:
+    return _limiter
@@ -2,20 +2,39 @@
 
 import json
 import os
-from typing import Any
+from typing import Any, Callable
+
+from tau_bench.envs.airline.inventory import FlightInventory
+from tau_bench.envs.compact import Compactor
 
 FOLDER_PATH = os.path.dirname(__file__)
 
 
-def load_data() -> dict[str, Any]:
-    with open(os.path.join(FOLDER_PATH, "flights.json")) as f:
-        flight_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "reservations.json")) as f:
-        reservation_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "users.json")) as f:
-        user_data = json.load(f)
+def _load_json(path: str) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_data(
+    load_json: Callable[[str], Any] = _load_json,
+    load_flights: Callable[[str], Any] = _load_json,
+) -> dict[str, Any]:
+    flight_data = load_flights(os.path.join(FOLDER_PATH, "flights.json"))
+    reservation_data = load_json(os.path.join(FOLDER_PATH, "reservations.json"))
+    user_data = load_json(os.path.join(FOLDER_PATH, "users.json"))
     return {
         "flights": flight_data,
         "reservations": reservation_data,
         "users": user_data,
     }
+
+
+def _load_flight_inventory(path: str) -> FlightInventory:
+    return FlightInventory(_load_json(path))
+
+
+def load_compact_data() -> dict[str, Any]:
+    # The flights have a columnar form of their own. It takes about 4 MB less
+    # than the dicts, but flight searches are about 1.5x slower (see
+    # benchmarks/bench_flight_search.py).
+    return load_data(Compactor().load, load_flights=_load_flight_inventory)
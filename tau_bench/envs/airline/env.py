@@ -1,10 +1,13 @@
 # Copyright Sierra
 
-from tau_bench.envs.airline.data import load_data
+from tau_bench.envs.airline.data import load_compact_data, load_data
 from tau_bench.envs.airline.rules import RULES
 from tau_bench.envs.airline.tools import ALL_TOOLS
 from tau_bench.envs.airline.wiki import WIKI
 from tau_bench.envs.base import Env
+from tau_bench.envs.db import copy_on_write_loader
+from tau_bench.envs.gt_hashes import load_gt_hashes
+from tau_bench.envs.task_store import load_tasks
 from typing import Optional, Union
 from tau_bench.envs.user import UserStrategy
 
@@ -17,14 +20,13 @@ class MockAirlineDomainEnv(Env):
         user_provider: Optional[str] = None,
         task_split: str = "test",
         task_index: Optional[int] = None,
+        compact_data: bool = False,
     ):
-        match task_split:
-            case "test":
-                from tau_bench.envs.airline.tasks_test import TASKS as tasks
-            case _:
-                raise ValueError(f"Unknown task split: {task_split}")
+        tasks = load_tasks("airline", task_split)
         super().__init__(
-            data_load_func=load_data,
+            data_load_func=copy_on_write_loader(
+                load_compact_data if compact_data else load_data
+            ),
             tools=ALL_TOOLS,
             tasks=tasks,
             wiki=WIKI,
@@ -35,3 +37,4 @@ class MockAirlineDomainEnv(Env):
             task_index=task_index,
         )
         self.terminate_tools = ["transfer_to_human_agents"]
+        self.gt_data_hashes = load_gt_hashes("airline", task_split)
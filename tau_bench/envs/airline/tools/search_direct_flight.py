@@ -1,16 +1,34 @@
 # Copyright Sierra
 
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
+from tau_bench.envs.airline.inventory import filter_by_status
+from tau_bench.envs.db import CopyOnWriteTable
 from tau_bench.envs.tool import Tool
 
 
+def route_key(flight: Dict[str, Any]) -> Tuple[str, str]:
+    return flight["origin"], flight["destination"]
+
+
+def origin_key(flight: Dict[str, Any]) -> str:
+    return flight["origin"]
+
+
 class SearchDirectFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+        if isinstance(flights, CopyOnWriteTable):
+            keys = flights.find_all("route", route_key, (origin, destination))
+            candidates = [
+                flights.peek(key)
+                for key in filter_by_status(flights, keys, "available", date)
+            ]
+        else:
+            candidates = flights.values()
         results = []
-        for flight in flights.values():
+        for flight in candidates:
             if flight["origin"] == origin and flight["destination"] == destination:
                 if (
                     date in flight["dates"]
@@ -1,27 +1,53 @@
 # Copyright Sierra
 
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Iterable
+from tau_bench.envs.airline.inventory import filter_by_status
+from tau_bench.envs.db import CopyOnWriteTable
 from tau_bench.envs.tool import Tool
+from tau_bench.envs.airline.tools.search_direct_flight import origin_key, route_key
 
 
 class SearchOnestopFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+
+        # with copy-on-write data, join the legs through the route index instead
+        # of scanning all flight pairs, and skip the flights that are not
+        # available on the leg's date; the candidates keep the table order
+        def first_legs() -> Iterable[Dict[str, Any]]:
+            if not isinstance(flights, CopyOnWriteTable):
+                return flights.values()
+            keys = flights.find_all("origin", origin_key, origin)
+            keys = filter_by_status(flights, keys, "available", date)
+            return [flights.peek(key) for key in keys]
+
+        def second_legs(flight1: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+            if not isinstance(flights, CopyOnWriteTable):
+                return flights.values()
+            stop = flight1["destination"]
+            keys = flights.find_all("route", route_key, (stop, destination))
+            if keys:
+                keys = filter_by_status(flights, keys, "available", get_date2(flight1))
+            return [flights.peek(key) for key in keys]
+
+        def get_date2(flight1: Dict[str, Any]) -> str:
+            return (
+                f"2024-05-{int(date[-2:])+1}"
+                if "+1" in flight1["scheduled_arrival_time_est"]
+                else date
+            )
+
         results = []
-        for flight1 in flights.values():
+        for flight1 in first_legs():
             if flight1["origin"] == origin:
-                for flight2 in flights.values():
+                for flight2 in second_legs(flight1):
                     if (
                         flight2["destination"] == destination
                         and flight1["destination"] == flight2["origin"]
                     ):
-                        date2 = (
-                            f"2024-05-{int(date[-2:])+1}"
-                            if "+1" in flight1["scheduled_arrival_time_est"]
-                            else date
-                        )
+                        date2 = get_date2(flight1)
                         if (
                             flight1["scheduled_arrival_time_est"]
                             > flight2["scheduled_departure_time_est"]
@@ -2,8 +2,13 @@
 
 import random
 from hashlib import sha256
+from collections.abc import Mapping
+from tau_bench.envs.db import CopyOnWriteTable
+from tau_bench.envs.gt_hashes import lookup_gt_hash
 from tau_bench.envs.tool import Tool
-from typing import Any, Callable, Dict, List, Type, Optional, Set, Union, Tuple
+from tau_bench.record import current_episode_log, no_episode_log
+from tau_bench.tracing import REWARD, TOOL, span, traced, untraced
+from typing import Any, Callable, Dict, List, Type, Optional, Sequence, Set, Union, Tuple
 
 from tau_bench.envs.user import load_user, UserStrategy
 from tau_bench.types import (
@@ -25,9 +30,9 @@ Hashable = Union[str, int, float, Tuple["Hashable"], Tuple[Tuple[str, "Hashable"
 
 
 def to_hashable(item: ToHashable) -> Hashable:
-    if isinstance(item, dict):
+    if isinstance(item, Mapping):
         return tuple((key, to_hashable(value)) for key, value in sorted(item.items()))
-    elif isinstance(item, list):
+    elif isinstance(item, (list, tuple)):
         return tuple(to_hashable(element) for element in item)
     elif isinstance(item, set):
         return tuple(sorted(to_hashable(element) for element in item))
@@ -41,12 +46,50 @@ def consistent_hash(
     return sha256(str(value).encode("utf-8")).hexdigest()
 
 
+def _hashable_repr(item: ToHashable) -> str:
+    return repr(to_hashable(item))
+
+
+def consistent_hash_tables(data: Dict[str, CopyOnWriteTable]) -> str:
+    """Equivalent to `consistent_hash(to_hashable(data))` for copy-on-write data.
+
+    The string that `consistent_hash` would build is streamed into the digest
+    piece by piece, reusing the cached representation of every record the
+    episode has not touched. The cost is proportional to the touched records
+    plus one SHA-256 pass, and the full string is never materialized.
+    """
+    digest = sha256()
+
+    def update(text: str) -> None:
+        digest.update(text.encode("utf-8"))
+
+    names = sorted(data.keys())
+    update("(")
+    for i, name in enumerate(names):
+        if i > 0:
+            update(", ")
+        table = data[name]
+        keys = sorted(table)
+        update(f"({name!r}, (")
+        for j, key in enumerate(keys):
+            if j > 0:
+                update(", ")
+            update(f"({key!r}, {table.record_repr(key, _hashable_repr)})")
+        if len(keys) == 1:
+            update(",")
+        update("))")
+    if len(names) == 1:
+        update(",")
+    update(")")
+    return digest.hexdigest()
+
+
 class Env(object):
     def __init__(
         self,
         data_load_func: Callable[[], Dict[str, Any]],
         tools: List[Type[Tool]],
-        tasks: List[Task],
+        tasks: Sequence[Task],
         wiki: str,
         rules: List[str],
         user_strategy: Union[str, UserStrategy],
@@ -74,36 +117,65 @@ class Env(object):
             user_strategy=user_strategy, model=user_model, provider=user_provider
         )
         self.actions: List[Action] = []
+        self.gt_data_hashes: Dict[str, Dict[str, str]] = {}
 
-    def reset(self, task_index: Optional[int] = None) -> EnvResetResponse:
+    def _reset_task(self, task_index: Optional[int]) -> None:
         if task_index is None:
             task_index = random.randint(0, len(self.tasks))
         self.task_index = task_index
         self.data = self.data_load_func()
         self.task = self.tasks[task_index]
         self.actions = []
+
+    def reset(self, task_index: Optional[int] = None) -> EnvResetResponse:
+        self._reset_task(task_index)
         initial_observation = self.user.reset(instruction=self.task.instruction)
         return EnvResetResponse(
             observation=initial_observation, info=EnvInfo(task=self.task, source="user")
         )
 
+    async def areset(self, task_index: Optional[int] = None) -> EnvResetResponse:
+        self._reset_task(task_index)
+        initial_observation = await self.user.areset(instruction=self.task.instruction)
+        return EnvResetResponse(
+            observation=initial_observation, info=EnvInfo(task=self.task, source="user")
+        )
+
     def step(self, action: Action) -> EnvResponse:
+        user_observation = None
+        if action.name == RESPOND_ACTION_NAME:
+            user_observation = self.user.step(action.kwargs["content"])
+        return self._apply_action(action, user_observation)
+
+    async def astep(self, action: Action) -> EnvResponse:
+        user_observation = None
+        if action.name == RESPOND_ACTION_NAME:
+            user_observation = await self.user.astep(action.kwargs["content"])
+        return self._apply_action(action, user_observation)
+
+    def _apply_action(
+        self, action: Action, user_observation: Optional[str]
+    ) -> EnvResponse:
         self.actions.append(action)
 
         info = EnvInfo(task=self.task)
         reward = 0
         done = False
         if action.name == RESPOND_ACTION_NAME:
-            observation = self.user.step(action.kwargs["content"])
+            observation = user_observation
             info.source = "user"
             done = "###STOP###" in observation
         elif action.name in self.tools_map:
             try:
-                observation = self.tools_map[action.name].invoke(
-                    data=self.data, **action.kwargs
-                )
+                with span(TOOL, tool=action.name):
+                    observation = self.tools_map[action.name].invoke(
+                        data=self.data, **action.kwargs
+                    )
             except Exception as e:
                 observation = f"Error: {e}"
+            episode_log = current_episode_log()
+            if episode_log is not None:
+                episode_log.tool_call(action.name, action.kwargs, observation)
             info.source = action.name
             if action.name in self.terminate_tools:
                 done = True
@@ -119,8 +191,20 @@ class Env(object):
         return EnvResponse(observation=observation, reward=reward, done=done, info=info)
 
     def get_data_hash(self) -> str:
+        if all(isinstance(table, CopyOnWriteTable) for table in self.data.values()):
+            return consistent_hash_tables(self.data)
         return consistent_hash(to_hashable(self.data))
 
+    def replay_gt_data_hash(self) -> str:
+        self.data = self.data_load_func()
+        # counted as part of the reward, not as the episode's tool calls
+        with untraced(), no_episode_log():
+            for action in self.task.actions:
+                if action.name not in self.terminate_tools:
+                    self.step(action)
+        return self.get_data_hash()
+
+    @traced(REWARD)
     def calculate_reward(self) -> RewardResult:
         data_hash = self.get_data_hash()
         reward = 1.0
@@ -129,12 +213,10 @@ class Env(object):
         ]
 
         # Check if the database changes are correct. If they are not correct, then we set the reward to 0.
-        # TODO: cache gt_data_hash in tasks.py (low priority)
-        self.data = self.data_load_func()
-        for action in self.task.actions:
-            if action.name not in self.terminate_tools:
-                self.step(action)
-        gt_data_hash = self.get_data_hash()
+        # Use the precomputed hash when available (see tau_bench/envs/gt_hashes.py)
+        gt_data_hash = lookup_gt_hash(self.gt_data_hashes, self.task_index, self.task)
+        if gt_data_hash is None:
+            gt_data_hash = self.replay_gt_data_hash()
         info = RewardActionInfo(
             r_actions=data_hash == gt_data_hash, gt_data_hash=gt_data_hash
         )
@@ -0,0 +1,113 @@
+# Copyright Sierra
+
+"""A compact, read-only representation of env data.
+
+`Compactor.load` parses a JSON data file into `CompactRecord`s instead of
+dicts: the keys of records with the same fields are stored once, in a shared
+layout, and the values in a tuple. Lists in records become tuples, and equal
+strings and numbers are stored once.
+
+Compact records read like the dicts they replace, and deep-copying one (as
+copy-on-write tables do before a record is handed out for writing, see
+`tau_bench/envs/db.py`) returns plain dicts and lists, so the tools work
+unchanged. Use compact data through `copy_on_write_loader` only.
+
+The envs load their data this way with `--compact-data`.
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class Layout(object):
+    """The field names shared by the compact records with the same fields."""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, keys: Tuple[str, ...]) -> None:
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys)}
+
+
+class CompactRecord(Mapping):
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, layout: Layout, values: Tuple[Any, ...]) -> None:
+        self._layout = layout
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._layout.positions[key]]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._layout.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other: object) -> bool:
+        return thaw(self) == thaw(other)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        return thaw(self)
+
+    def __repr__(self) -> str:
+        return repr(thaw(self))
+
+
+def thaw(value: Any) -> Any:
+    """Convert compact records and tuples back to dicts and lists."""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class Compactor(object):
+    """Builds compact records while JSON is parsed, sharing layouts and values.
+
+    The first record with given fields stays a dict, and so do records whose
+    fields are ids (e.g. a user's payment methods): a layout only pays off
+    once it is shared.
+    """
+
+    def __init__(self) -> None:
+        self.layouts: Dict[Tuple[str, ...], Optional[Layout]] = {}
+        self.scalars: Dict[Tuple[type, Any], Any] = {}
+
+    def scalar(self, value: Any) -> Any:
+        # keyed on the type too, since 1 == 1.0 == True
+        if isinstance(value, (str, int, float)):
+            return self.scalars.setdefault((type(value), value), value)
+        return value
+
+    def object_pairs_hook(self, pairs: List[Tuple[str, Any]]) -> Any:
+        keys = tuple(self.scalar(key) for key, _ in pairs)
+        if len(set(keys)) < len(keys):
+            # repeated keys: the last value wins, as in a dict
+            return dict(zip(keys, (self.scalar(value) for _, value in pairs)))
+        if keys not in self.layouts:
+            self.layouts[keys] = None
+            # lists stay lists here: deep copies of dicts keep tuples as is
+            return {key: self.scalar(value) for key, (_, value) in zip(keys, pairs)}
+        layout = self.layouts[keys]
+        if layout is None:
+            layout = self.layouts[keys] = Layout(keys)
+        return CompactRecord(
+            layout, tuple(self.scalar(_freeze(value)) for _, value in pairs)
+        )
+
+    def load(self, path: str) -> Any:
+        with open(path) as f:
+            return json.load(f, object_pairs_hook=self.object_pairs_hook)
@@ -0,0 +1,239 @@
+# Copyright Sierra
+
+import threading
+from copy import deepcopy
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+_base_data: Dict[Callable[[], Dict[str, Any]], Dict[str, Any]] = {}
+_base_caches: Dict[Callable[[], Dict[str, Any]], Dict[str, "BaseTableCache"]] = {}
+_base_data_lock = threading.Lock()
+
+
+class BaseTableCache(object):
+    """Values derived from a read-only base table, shared by all of its overlays.
+
+    `reprs` keeps the representation of every base record once the data has
+    been hashed, for the life of the process: about 1.5 MB for retail and
+    3.7 MB for airline, once per process rather than per episode. Digests of
+    the records would be smaller, but the data hash is a single SHA-256 of
+    the whole representation (see `consistent_hash_tables`), which keeps it
+    equal to the `gt_data_hash` of earlier results.
+    """
+
+    def __init__(self, base: Dict[str, Any]) -> None:
+        self.reprs: Dict[str, str] = {}
+        self.indexes: Dict[str, Dict[Hashable, List[str]]] = {}
+        self.derived: Dict[str, Any] = {}
+        self.positions = {key: position for position, key in enumerate(base)}
+
+
+class CopyOnWriteTable(MutableMapping):
+    """A table (e.g. `users`, `orders`) layered over a shared, read-only base.
+
+    Records are deep-copied into a per-episode overlay the first time they are
+    looked up by key, so tools can keep mutating them in place without touching
+    the base. `values()` and `items()` hand out the current records without
+    copying and must only be used for reading.
+
+    `base_cache` holds per-record strings (see `record_repr`), secondary
+    indexes (see `find_first`) and other values derived from the base. It is
+    shared by every table over the same base, so each is computed at most once
+    per process.
+    """
+
+    def __init__(
+        self, base: Dict[str, Any], base_cache: Optional[BaseTableCache] = None
+    ) -> None:
+        self._base = base
+        self._base_cache = base_cache if base_cache is not None else BaseTableCache(base)
+        self._overlay: Dict[str, Any] = {}
+        self._deleted: Set[str] = set()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        record = deepcopy(self._base[key])
+        self._overlay[key] = record
+        return record
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._overlay[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._overlay or (key in self._base and key not in self._deleted)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._overlay:
+            if key not in self._base:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._base) - len(self._deleted) + sum(
+            1 for key in self._overlay if key not in self._base
+        )
+
+    @property
+    def base(self) -> Dict[str, Any]:
+        """The shared base records, read-only."""
+        return self._base
+
+    def peek(self, key: str) -> Any:
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        return self._base[key]
+
+    def values(self) -> Iterator[Any]:
+        for key in self:
+            yield self.peek(key)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for key in self:
+            yield key, self.peek(key)
+
+    def record_repr(self, key: str, to_repr: Callable[[Any], str]) -> str:
+        """Return `to_repr(record)`, cached for records never copied into the overlay.
+
+        Records in the overlay may have been mutated in place at any time, so
+        their representation is always recomputed.
+        """
+        if key in self._overlay:
+            return to_repr(self._overlay[key])
+        if key in self._deleted:
+            raise KeyError(key)
+        cached = self._base_cache.reprs.get(key)
+        if cached is None:
+            cached = to_repr(self._base[key])
+            self._base_cache.reprs[key] = cached
+        return cached
+
+    def _get_index(
+        self, index_name: str, key_func: Callable[[Any], Hashable]
+    ) -> Dict[Hashable, List[str]]:
+        index = self._base_cache.indexes.get(index_name)
+        if index is None:
+            index = {}
+            for key, record in self._base.items():
+                index.setdefault(key_func(record), []).append(key)
+            self._base_cache.indexes[index_name] = index
+        return index
+
+    def _iter_overlay_positions(self) -> Iterator[Tuple[int, str, Any]]:
+        positions = self._base_cache.positions
+        num_new = 0
+        for key, record in self._overlay.items():
+            if key in positions:
+                yield positions[key], key, record
+            else:
+                yield len(positions) + num_new, key, record
+                num_new += 1
+
+    def find_first(
+        self, index_name: str, key_func: Callable[[Any], Hashable], value: Hashable
+    ) -> Optional[str]:
+        """Return the first key, in iteration order, whose record has `key_func(record) == value`.
+
+        Same result as a linear scan over `items()`, but untouched records are
+        looked up in an index over the base built once per process, and only
+        the records in the overlay are scanned.
+        """
+        positions = self._base_cache.positions
+        best: Optional[Tuple[int, str]] = None
+        for key in self._get_index(index_name, key_func).get(value, []):
+            if key not in self._overlay and key not in self._deleted:
+                best = (positions[key], key)
+                break
+        for position, key, record in self._iter_overlay_positions():
+            if (best is None or position < best[0]) and key_func(record) == value:
+                best = (position, key)
+        return best[1] if best is not None else None
+
+    def find_all(
+        self, index_name: str, key_func: Callable[[Any], Hashable], value: Hashable
+    ) -> List[str]:
+        """Return all keys, in iteration order, whose record has `key_func(record) == value`."""
+        positions = self._base_cache.positions
+        matches = [
+            (positions[key], key)
+            for key in self._get_index(index_name, key_func).get(value, [])
+            if key not in self._overlay and key not in self._deleted
+        ]
+        if self._overlay:
+            matches.extend(
+                (position, key)
+                for position, key, record in self._iter_overlay_positions()
+                if key_func(record) == value
+            )
+            matches.sort()
+        return [key for _, key in matches]
+
+    def is_pristine(self) -> bool:
+        """Whether the table still holds exactly the base records."""
+        if self._deleted:
+            return False
+        for key, record in self._overlay.items():
+            if key not in self._base or record != self._base[key]:
+                return False
+        return True
+
+    def derived(self, name: str, func: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Return `func(base)`, computed once per process. Only valid if `is_pristine()`."""
+        if name not in self._base_cache.derived:
+            self._base_cache.derived[name] = func(self._base)
+        return self._base_cache.derived[name]
+
+    def touched_keys(self) -> Set[str]:
+        return set(self._overlay) | self._deleted
+
+    def reset(self) -> None:
+        self._overlay = {}
+        self._deleted = set()
+
+
+def load_base_data(load_func: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Parse the data returned by `load_func` once per process and cache it."""
+    if load_func not in _base_data:
+        with _base_data_lock:
+            if load_func not in _base_data:
+                data = load_func()
+                _base_caches[load_func] = {
+                    name: BaseTableCache(table) for name, table in data.items()
+                }
+                _base_data[load_func] = data
+    return _base_data[load_func]
+
+
+def copy_on_write_loader(
+    load_func: Callable[[], Dict[str, Any]],
+) -> Callable[[], Dict[str, Any]]:
+    """Wrap a data loader so every call returns fresh copy-on-write tables.
+
+    The underlying JSON is parsed once per process; each call only allocates
+    empty overlays, so resetting an episode costs O(mutations) instead of
+    O(database size).
+    """
+
+    def _load() -> Dict[str, Any]:
+        base = load_base_data(load_func)
+        base_caches = _base_caches[load_func]
+        return {
+            name: CopyOnWriteTable(table, base_caches[name])
+            for name, table in base.items()
+        }
+
+    return _load
@@ -0,0 +1,129 @@
+# Copyright Sierra
+
+"""Precomputed ground-truth data hashes for each task.
+
+`Env.calculate_reward` needs the hash of the database after replaying a task's
+ground-truth actions. That value only depends on the task, the data files and
+the tool code, so it can be computed once offline:
+
+    python precompute_gt_hashes.py --env retail --task-split test
+
+Entries are keyed on a digest of the data files and tool code, and on a digest
+of each task's actions, so stale entries are ignored rather than trusted.
+"""
+
+import os
+import json
+import functools
+from glob import glob
+from hashlib import sha256
+from typing import Any, Dict, List, Optional
+
+from tau_bench.envs.task_store import TASK_MODULES
+from tau_bench.types import Task
+
+ENVS_PATH = os.path.dirname(__file__)
+TASK_SPLITS = {env_name: list(splits) for env_name, splits in TASK_MODULES.items()}
+
+
+def get_gt_hashes_path(env_name: str) -> str:
+    return os.path.join(ENVS_PATH, env_name, "gt_hashes.json")
+
+
+@functools.lru_cache(maxsize=None)
+def get_env_digest(env_name: str) -> str:
+    """Digest of everything that determines the ground-truth database state.
+
+    Covers the data files and all the code of the env package and of
+    `tau_bench/envs/` (loading, compact forms, tools, hashing), except the
+    task modules, which are keyed per task instead.
+    """
+    paths = sorted(glob(os.path.join(ENVS_PATH, env_name, "data", "*.json")))
+    task_modules = set(module for module, _ in TASK_MODULES.get(env_name, {}).values())
+    paths += sorted(
+        path
+        for path in glob(os.path.join(ENVS_PATH, env_name, "**", "*.py"), recursive=True)
+        if os.path.splitext(os.path.basename(path))[0] not in task_modules
+    )
+    paths += sorted(glob(os.path.join(ENVS_PATH, "*.py")))
+    digest = sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, ENVS_PATH).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def get_task_digest(task: Task) -> str:
+    actions = [action.model_dump() for action in task.actions]
+    return sha256(json.dumps(actions, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_gt_hashes_file(env_name: str) -> Dict[str, Any]:
+    path = get_gt_hashes_path(env_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_gt_hashes(env_name: str, task_split: str) -> Dict[str, Dict[str, str]]:
+    """Return `{task_index: {"task_digest": ..., "gt_data_hash": ...}}` for a split.
+
+    Returns an empty dict if nothing was precomputed or the data files or tool
+    code changed since.
+    """
+    content = _load_gt_hashes_file(env_name)
+    if content.get("env_digest") != get_env_digest(env_name):
+        return {}
+    return content.get("splits", {}).get(task_split, {})
+
+
+def lookup_gt_hash(
+    gt_hashes: Dict[str, Dict[str, str]], task_index: int, task: Task
+) -> Optional[str]:
+    entry = gt_hashes.get(str(task_index))
+    if entry is None or entry["task_digest"] != get_task_digest(task):
+        return None
+    return entry["gt_data_hash"]
+
+
+def compute_gt_hashes(env_name: str, task_split: str) -> Dict[str, Dict[str, str]]:
+    from tau_bench.envs import get_env
+
+    # the human user is never called: ground-truth actions contain no responses
+    env = get_env(
+        env_name,
+        user_strategy="human",
+        user_model="",
+        task_split=task_split,
+        task_index=0,
+    )
+    gt_hashes = {}
+    for task_index, task in enumerate(env.tasks):
+        env.task_index = task_index
+        env.task = task
+        env.actions = []
+        gt_hashes[str(task_index)] = {
+            "task_digest": get_task_digest(task),
+            "gt_data_hash": env.replay_gt_data_hash(),
+        }
+    return gt_hashes
+
+
+def save_gt_hashes(env_name: str, task_splits: List[str]) -> str:
+    env_digest = get_env_digest(env_name)
+    content = _load_gt_hashes_file(env_name)
+    if content.get("env_digest") != env_digest:
+        content = {"env_digest": env_digest, "splits": {}}
+    else:
+        content = {"env_digest": env_digest, "splits": dict(content["splits"])}
+    for task_split in task_splits:
+        print(f"Computing ground-truth hashes for {env_name} ({task_split})")
+        content["splits"][task_split] = compute_gt_hashes(env_name, task_split)
+    path = get_gt_hashes_path(env_name)
+    with open(path, "w") as f:
+        json.dump(content, f, indent=2)
+    _load_gt_hashes_file.cache_clear()
+    return path
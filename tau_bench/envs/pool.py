@@ -0,0 +1,95 @@
+# Copyright Sierra
+
+"""A pool of environments reused across episodes.
+
+Constructing an env builds its tool schemas, loads its data and creates its
+user simulator. None of that depends on the task, and `Env.reset(task_index)`
+already restores everything that does (the task, a fresh copy of the data, the
+actions and the user's conversation), so the runner keeps at most one env per
+concurrent episode and reuses it for the episodes that follow.
+
+A background thread builds envs ahead of demand, one at a time, so that an
+episode starting while the pool is still growing usually finds one ready.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+from tau_bench.envs.base import Env
+
+
+class EnvPool(object):
+    def __init__(self, make_env: Callable[[], Env], max_size: int) -> None:
+        assert max_size >= 1, "Invalid env pool size"
+        self.make_env = make_env
+        self.max_size = max_size
+        self.num_created = 0
+        self._idle: List[Env] = []
+        self._filling = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._filler = threading.Thread(target=self._fill, name="env-pool-filler", daemon=True)
+        self._filler.start()
+
+    def _fill(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and (
+                    self._idle or self.num_created >= self.max_size
+                ):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self.num_created += 1
+                self._filling = True
+            try:
+                env = self.make_env()
+            except BaseException:
+                # episodes build their own envs from now on, and surface the error
+                with self._cond:
+                    self.num_created -= 1
+                    self._filling = False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._idle.append(env)
+                self._filling = False
+                self._cond.notify_all()
+
+    def acquire(self) -> Env:
+        with self._cond:
+            # wait for an env the filler is building rather than build another
+            while not self._idle and (self._filling or self.num_created >= self.max_size):
+                self._cond.wait()
+            if self._idle:
+                env = self._idle.pop()
+                # the filler prepares the next one
+                self._cond.notify_all()
+                return env
+            self.num_created += 1
+        try:
+            return self.make_env()
+        except BaseException:
+            with self._cond:
+                self.num_created -= 1
+                self._cond.notify_all()
+            raise
+
+    def release(self, env: Env) -> None:
+        with self._cond:
+            self._idle.append(env)
+            self._cond.notify_all()
+
+    @contextmanager
+    def env(self) -> Iterator[Env]:
+        env = self.acquire()
+        try:
+            yield env
+        finally:
+            self.release(env)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
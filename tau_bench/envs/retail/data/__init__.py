@@ -2,20 +2,28 @@
 
 import json
 import os
-from typing import Any
+from typing import Any, Callable
+
+from tau_bench.envs.compact import Compactor
 
 FOLDER_PATH = os.path.dirname(__file__)
 
 
-def load_data() -> dict[str, Any]:
-    with open(os.path.join(FOLDER_PATH, "orders.json")) as f:
-        order_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "products.json")) as f:
-        product_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "users.json")) as f:
-        user_data = json.load(f)
+def _load_json(path: str) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_data(load_json: Callable[[str], Any] = _load_json) -> dict[str, Any]:
+    order_data = load_json(os.path.join(FOLDER_PATH, "orders.json"))
+    product_data = load_json(os.path.join(FOLDER_PATH, "products.json"))
+    user_data = load_json(os.path.join(FOLDER_PATH, "users.json"))
     return {
         "orders": order_data,
         "products": product_data,
         "users": user_data,
     }
+
+
+def load_compact_data() -> dict[str, Any]:
+    return load_data(Compactor().load)
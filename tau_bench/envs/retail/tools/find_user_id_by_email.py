@@ -1,13 +1,21 @@
 # Copyright Sierra
 
 from typing import Any, Dict
+from tau_bench.envs.db import CopyOnWriteTable
 from tau_bench.envs.tool import Tool
 
 
+def _email_key(profile: Dict[str, Any]) -> str:
+    return profile["email"].lower()
+
+
 class FindUserIdByEmail(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], email: str) -> str:
         users = data["users"]
+        if isinstance(users, CopyOnWriteTable):
+            user_id = users.find_first("email", _email_key, email.lower())
+            return user_id if user_id is not None else "Error: user not found"
         for user_id, profile in users.items():
             if profile["email"].lower() == email.lower():
                 return user_id
@@ -1,13 +1,27 @@
 # Copyright Sierra
 
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
+from tau_bench.envs.db import CopyOnWriteTable
 from tau_bench.envs.tool import Tool
 
 
+def _name_zip_key(profile: Dict[str, Any]) -> Tuple[str, str, str]:
+    return (
+        profile["name"]["first_name"].lower(),
+        profile["name"]["last_name"].lower(),
+        profile["address"]["zip"],
+    )
+
+
 class FindUserIdByNameZip(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], first_name: str, last_name: str, zip: str) -> str:
         users = data["users"]
+        if isinstance(users, CopyOnWriteTable):
+            user_id = users.find_first(
+                "name_zip", _name_zip_key, (first_name.lower(), last_name.lower(), zip)
+            )
+            return user_id if user_id is not None else "Error: user not found"
         for user_id, profile in users.items():
             if (
                 profile["name"]["first_name"].lower() == first_name.lower()
@@ -2,18 +2,25 @@
 
 import json
 from typing import Any, Dict
+from tau_bench.envs.db import CopyOnWriteTable
 from tau_bench.envs.tool import Tool
 
 
+def _list_product_types(products: Dict[str, Any]) -> str:
+    product_dict = {
+        product["name"]: product["product_id"] for product in products.values()
+    }
+    product_dict = dict(sorted(product_dict.items()))
+    return json.dumps(product_dict)
+
+
 class ListAllProductTypes(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any]) -> str:
         products = data["products"]
-        product_dict = {
-            product["name"]: product["product_id"] for product in products.values()
-        }
-        product_dict = dict(sorted(product_dict.items()))
-        return json.dumps(product_dict)
+        if isinstance(products, CopyOnWriteTable) and products.is_pristine():
+            return products.derived("product_types", _list_product_types)
+        return _list_product_types(products)
 
     @staticmethod
     def get_info() -> Dict[str, Any]:
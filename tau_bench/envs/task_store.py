@@ -0,0 +1,144 @@
+# Copyright Sierra
+
+"""Compiled task stores, loaded lazily.
+
+The task splits are defined as Python modules of `Task(...)` calls, and
+importing one validates every task in it. For runs that only need a few tasks,
+each split can be compiled once into a JSONL file with one task per line and
+an index of line offsets:
+
+    python compile_tasks.py --env retail
+
+`load_tasks` then returns a `TaskStore`, which reads and validates a task only
+when it is accessed. The index records a digest of the task module, so a store
+that is older than its module is ignored and the module is imported instead.
+"""
+
+import os
+import json
+import functools
+import importlib
+from hashlib import sha256
+from typing import Dict, List, Optional, Sequence, Tuple, Union, overload
+
+from tau_bench.types import Task
+
+ENVS_PATH = os.path.dirname(__file__)
+# the module and variable defining each task split
+TASK_MODULES: Dict[str, Dict[str, Tuple[str, str]]] = {
+    "retail": {
+        "test": ("tasks_test", "TASKS_TEST"),
+        "train": ("tasks_train", "TASKS_TRAIN"),
+        "dev": ("tasks_dev", "TASKS_DEV"),
+        "think": ("tasks_think", "TASKS_THINK"),
+    },
+    "airline": {
+        "test": ("tasks_test", "TASKS"),
+    },
+}
+
+
+def _get_task_module(env_name: str, task_split: str) -> Tuple[str, str]:
+    splits = TASK_MODULES.get(env_name)
+    if splits is None:
+        raise ValueError(f"Unknown environment: {env_name}")
+    if task_split not in splits:
+        raise ValueError(f"Unknown task split: {task_split}")
+    return splits[task_split]
+
+
+def get_task_store_paths(env_name: str, task_split: str) -> Tuple[str, str]:
+    """Paths of the compiled tasks and of their index."""
+    module_name, _ = _get_task_module(env_name, task_split)
+    base = os.path.join(ENVS_PATH, env_name, module_name)
+    return base + ".jsonl", base + ".index.json"
+
+
+@functools.lru_cache(maxsize=None)
+def get_task_module_digest(env_name: str, task_split: str) -> str:
+    module_name, _ = _get_task_module(env_name, task_split)
+    with open(os.path.join(ENVS_PATH, env_name, module_name + ".py"), "rb") as f:
+        return sha256(f.read()).hexdigest()
+
+
+def import_tasks(env_name: str, task_split: str) -> List[Task]:
+    module_name, variable = _get_task_module(env_name, task_split)
+    module = importlib.import_module(f"tau_bench.envs.{env_name}.{module_name}")
+    return getattr(module, variable)
+
+
+class TaskStore(Sequence[Task]):
+    """The tasks of a compiled split, each read and validated on first access."""
+
+    def __init__(self, path: str, offsets: List[int]) -> None:
+        self.path = path
+        self.offsets = offsets
+        self._tasks: Dict[int, Task] = {}
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @overload
+    def __getitem__(self, index: int) -> Task: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Task]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Task, List[Task]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("task index out of range")
+        task = self._tasks.get(index)
+        if task is None:
+            with open(self.path, "rb") as f:
+                f.seek(self.offsets[index])
+                task = Task.model_validate_json(f.readline())
+            # keeps one instance per task if threads race to read it
+            task = self._tasks.setdefault(index, task)
+        return task
+
+
+def load_task_store(env_name: str, task_split: str) -> Optional[TaskStore]:
+    """Return the compiled store of a split, or None if it is missing or stale."""
+    tasks_path, index_path = get_task_store_paths(env_name, task_split)
+    if not os.path.exists(tasks_path) or not os.path.exists(index_path):
+        return None
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    if index.get("module_digest") != get_task_module_digest(env_name, task_split):
+        return None
+    return TaskStore(tasks_path, index["offsets"])
+
+
+def load_tasks(env_name: str, task_split: str) -> Sequence[Task]:
+    """The tasks of a split, from its compiled store if it is up to date."""
+    store = load_task_store(env_name, task_split)
+    if store is not None:
+        return store
+    return import_tasks(env_name, task_split)
+
+
+def compile_tasks(env_name: str, task_split: str) -> str:
+    tasks = import_tasks(env_name, task_split)
+    tasks_path, index_path = get_task_store_paths(env_name, task_split)
+    # the index is removed first and written last, so that an interrupted
+    # compile leaves no store rather than an inconsistent one
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    offsets = []
+    with open(tasks_path, "wb") as f:
+        for task in tasks:
+            offsets.append(f.tell())
+            f.write(task.model_dump_json().encode("utf-8") + b"\n")
+    with open(index_path, "w") as f:
+        json.dump(
+            {
+                "module_digest": get_task_module_digest(env_name, task_split),
+                "offsets": offsets,
+            },
+            f,
+        )
+    return tasks_path
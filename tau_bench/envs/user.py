@@ -2,10 +2,12 @@
 
 import abc
 import enum
-from litellm import completion
+import asyncio
+from tau_bench.llm import completion, acompletion
 
 from typing import Optional, List, Dict, Any, Union
 from tau_bench.token_utils import truncate_messages
+from tau_bench.tracing import USER_LLM, record_usage, span
 
 
 class BaseUserSimulationEnv(abc.ABC):
@@ -23,6 +25,12 @@ class BaseUserSimulationEnv(abc.ABC):
     def get_total_cost(self) -> float:
         raise NotImplementedError
 
+    async def areset(self, instruction: Optional[str] = None) -> str:
+        return await asyncio.to_thread(self.reset, instruction)
+
+    async def astep(self, content: str) -> str:
+        return await asyncio.to_thread(self.step, content)
+
 
 class HumanUserSimulationEnv(BaseUserSimulationEnv):
     def reset(self, instruction: str) -> str:
@@ -42,13 +50,26 @@ class LLMUserSimulationEnv(BaseUserSimulationEnv):
         self.model = model
         self.provider = provider
         self.total_cost = 0.0
-        self.reset()
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         messages = truncate_messages(messages)
-        res = completion(
-            model=self.model, custom_llm_provider=self.provider, messages=messages
-        )
+        with span(USER_LLM) as s:
+            res = completion(
+                model=self.model, custom_llm_provider=self.provider, messages=messages
+            )
+            record_usage(s, res)
+        message = res.choices[0].message
+        self.messages.append(message.model_dump())
+        self.total_cost = res._hidden_params["response_cost"]
+        return message.content
+
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        messages = truncate_messages(messages)
+        with span(USER_LLM) as s:
+            res = await acompletion(
+                model=self.model, custom_llm_provider=self.provider, messages=messages
+            )
+            record_usage(s, res)
         message = res.choices[0].message
         self.messages.append(message.model_dump())
         self.total_cost = res._hidden_params["response_cost"]
@@ -83,15 +104,25 @@ Rules:
         self.messages.append({"role": "user", "content": content})
         return self.generate_next_message(self.messages)
 
+    async def areset(self, instruction: Optional[str] = None) -> str:
+        self.messages = [
+            {
+                "role": "system",
+                "content": self.build_system_prompt(instruction=instruction),
+            },
+            {"role": "user", "content": "Hi! How can I help you today?"},
+        ]
+        return await self.agenerate_next_message(self.messages)
+
+    async def astep(self, content: str) -> str:
+        self.messages.append({"role": "user", "content": content})
+        return await self.agenerate_next_message(self.messages)
+
     def get_total_cost(self) -> float:
         return self.total_cost
 
 
 class ReactUserSimulationEnv(LLMUserSimulationEnv):
-    def __init__(self, model: str, provider: str) -> None:
-        super().__init__(model=model, provider=provider)
-        self.reset()
-
     def build_system_prompt(self, instruction: Optional[str]) -> str:
         instruction_display = (
             ("\n\nInstruction: " + instruction + "\n")
@@ -118,9 +149,23 @@ User Response:
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         messages = truncate_messages(messages)
-        res = completion(
-            model=self.model, custom_llm_provider=self.provider, messages=messages
-        )
+        with span(USER_LLM) as s:
+            res = completion(
+                model=self.model, custom_llm_provider=self.provider, messages=messages
+            )
+            record_usage(s, res)
+        message = res.choices[0].message
+        self.messages.append(message.model_dump())
+        self.total_cost = res._hidden_params["response_cost"]
+        return self.parse_response(message.content)
+
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        messages = truncate_messages(messages)
+        with span(USER_LLM) as s:
+            res = await acompletion(
+                model=self.model, custom_llm_provider=self.provider, messages=messages
+            )
+            record_usage(s, res)
         message = res.choices[0].message
         self.messages.append(message.model_dump())
         self.total_cost = res._hidden_params["response_cost"]
@@ -158,19 +203,19 @@ User Response:
 
 class VerifyUserSimulationEnv(LLMUserSimulationEnv):
     def __init__(self, model: str, provider: str, max_attempts: int = 3) -> None:
-        self.model = model
-        self.provider = provider
+        super().__init__(model=model, provider=provider)
         self.max_attempts = max_attempts
-        self.reset()
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         messages = truncate_messages(messages)
         attempts = 0
         cur_message = None
         while attempts < self.max_attempts:
-            res = completion(
-                model=self.model, custom_llm_provider=self.provider, messages=messages
-            )
+            with span(USER_LLM) as s:
+                res = completion(
+                    model=self.model, custom_llm_provider=self.provider, messages=messages
+                )
+                record_usage(s, res)
             cur_message = res.choices[0].message
             self.total_cost = res._hidden_params["response_cost"]
             if verify(self.model, self.provider, cur_message, messages):
@@ -180,6 +225,9 @@ class VerifyUserSimulationEnv(LLMUserSimulationEnv):
         assert cur_message is not None
         return cur_message.content
 
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        return await asyncio.to_thread(self.generate_next_message, messages)
+
     def reset(self, instruction: Optional[str] = None) -> str:
         self.messages = [
             {
@@ -229,11 +277,13 @@ Your answer will be parsed, so do not include any other text than the classifica
 
 Classification:"""
     verify_messages = truncate_messages([{"role": "user", "content": prompt}])
-    res = completion(
-        model=model,
-        custom_llm_provider=provider,
-        messages=verify_messages,
-    )
+    with span(USER_LLM) as s:
+        res = completion(
+            model=model,
+            custom_llm_provider=provider,
+            messages=verify_messages,
+        )
+        record_usage(s, res)
     return "true" in res.choices[0].message.content.lower()
 
 
@@ -264,21 +314,21 @@ Reflection:
 Response:
 <the response (this will be parsed and sent to the agent)>"""
     reflect_messages = truncate_messages([{"role": "user", "content": prompt}])
-    res = completion(
-        model=model,
-        custom_llm_provider=provider,
-        messages=reflect_messages,
-    )
+    with span(USER_LLM) as s:
+        res = completion(
+            model=model,
+            custom_llm_provider=provider,
+            messages=reflect_messages,
+        )
+        record_usage(s, res)
     _, response = res.choices[0].message.content.split("Response:")
     return response.strip()
 
 
 class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
     def __init__(self, model: str, provider: str, max_attempts: int = 2) -> None:
-        self.model = model
-        self.provider = provider
+        super().__init__(model=model, provider=provider)
         self.max_attempts = max_attempts
-        self.reset()
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         cur_messages = messages.copy()
@@ -297,6 +347,9 @@ class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
             attempts += 1
         return initial_response
 
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        return await asyncio.to_thread(self.generate_next_message, messages)
+
     def reset(self, instruction: Optional[str] = None) -> str:
         self.messages = [
             {
@@ -0,0 +1,203 @@
+# Copyright Sierra
+
+"""The chat completion calls made by agents and user simulators.
+
+Drop-in replacements for `litellm.completion` and `litellm.acompletion` that
+are answered from the recording when replaying an episode (see
+`tau_bench/record.py`), go through the run's response cache if one is set with
+`set_llm_cache`, and are recorded when recording an episode. The latency and
+congestion errors of calls that reach a model server are reported to the
+adaptive concurrency limiter, if any (see `tau_bench/concurrency.py`), and
+transient errors are retried according to the retry policy (see
+`tau_bench/retry.py`). Identical deterministic requests in flight at the same
+time are sent once if a coalescer is set (see `tau_bench/coalesce.py`), and
+`set_http_pool` makes all calls share one pool of HTTP connections.
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+import litellm
+
+from tau_bench.coalesce import RequestCoalescer
+
+from tau_bench.concurrency import get_concurrency_limiter
+from tau_bench.llm_cache import LLMCache
+from tau_bench.record import current_episode_log
+from tau_bench.retry import RetryPolicy, acall_with_retries, call_with_retries
+
+# errors that mean the model server is overloaded
+CONGESTION_ERRORS = (
+    litellm.RateLimitError,
+    litellm.Timeout,
+    litellm.ServiceUnavailableError,
+)
+
+_llm_cache: Optional[LLMCache] = None
+_retry_policy: Optional[RetryPolicy] = RetryPolicy()
+_coalescer: Optional[RequestCoalescer] = None
+_http_pool_options: Optional[Dict[str, Any]] = None
+_http_session: Optional[httpx.Client] = None
+
+
+def set_llm_cache(cache: Optional[LLMCache]) -> None:
+    global _llm_cache
+    _llm_cache = cache
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    return _llm_cache
+
+
+def set_retry_policy(policy: Optional[RetryPolicy]) -> None:
+    global _retry_policy
+    _retry_policy = policy
+
+
+def set_request_coalescer(coalescer: Optional[RequestCoalescer]) -> None:
+    global _coalescer
+    _coalescer = coalescer
+
+
+def get_request_coalescer() -> Optional[RequestCoalescer]:
+    return _coalescer
+
+
+def set_http_pool(max_connections: Optional[int] = None, http2: bool = False) -> None:
+    """Send all synchronous calls over one pool of up to `max_connections`
+    keep-alive connections, using HTTP/2 with servers that support it."""
+    global _http_pool_options
+    _http_pool_options = {
+        "limits": httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        ),
+        "http2": http2,
+        "follow_redirects": True,
+    }
+    _replace_session(httpx.Client(**_http_pool_options))
+
+
+def clear_http_pool() -> None:
+    """Go back to the connections of each provider client."""
+    global _http_pool_options
+    _http_pool_options = None
+    if _http_session is not None:
+        _replace_session(None)
+
+
+def _replace_session(session: Optional[httpx.Client]) -> None:
+    global _http_session
+    old_session, _http_session = _http_session, session
+    litellm.client_session = session
+    # litellm caches provider clients, which would keep using the old session
+    litellm.in_memory_llm_clients_cache.flush_cache()
+    if old_session is not None:
+        old_session.close()
+
+
+@asynccontextmanager
+async def async_http_pool() -> AsyncIterator[None]:
+    """The same for asynchronous calls on the running event loop."""
+    if _http_pool_options is None:
+        yield
+        return
+    # async connections are bound to the event loop that opened them
+    litellm.aclient_session = httpx.AsyncClient(**_http_pool_options)
+    try:
+        yield
+    finally:
+        session, litellm.aclient_session = litellm.aclient_session, None
+        litellm.in_memory_llm_clients_cache.flush_cache()
+        await session.aclose()
+
+
+def _call(**kwargs: Any) -> Any:
+    limiter = get_concurrency_limiter()
+    if limiter is None:
+        return litellm.completion(**kwargs)
+    start = time.perf_counter()
+    try:
+        res = litellm.completion(**kwargs)
+    except CONGESTION_ERRORS:
+        limiter.observe(kwargs.get("model"), time.perf_counter() - start, congested=True)
+        raise
+    limiter.observe(kwargs.get("model"), time.perf_counter() - start)
+    return res
+
+
+async def _acall(**kwargs: Any) -> Any:
+    limiter = get_concurrency_limiter()
+    if limiter is None:
+        return await litellm.acompletion(**kwargs)
+    start = time.perf_counter()
+    try:
+        res = await litellm.acompletion(**kwargs)
+    except CONGESTION_ERRORS:
+        limiter.observe(kwargs.get("model"), time.perf_counter() - start, congested=True)
+        raise
+    limiter.observe(kwargs.get("model"), time.perf_counter() - start)
+    return res
+
+
+def _call_with_retries(**kwargs: Any) -> Any:
+    if _retry_policy is None:
+        return _call(**kwargs)
+    return call_with_retries(_call, kwargs, _retry_policy)
+
+
+async def _acall_with_retries(**kwargs: Any) -> Any:
+    if _retry_policy is None:
+        return await _acall(**kwargs)
+    return await acall_with_retries(_acall, kwargs, _retry_policy)
+
+
+def _send(**kwargs: Any) -> Any:
+    coalescer = _coalescer
+    if coalescer is None:
+        return _call_with_retries(**kwargs)
+    return coalescer.call(kwargs, _call_with_retries)
+
+
+async def _asend(**kwargs: Any) -> Any:
+    coalescer = _coalescer
+    if coalescer is None:
+        return await _acall_with_retries(**kwargs)
+    return await coalescer.acall(kwargs, _acall_with_retries)
+
+
+def completion(**kwargs: Any) -> Any:
+    episode_log = current_episode_log()
+    if episode_log is not None and episode_log.replaying:
+        return episode_log.replay_completion(kwargs)
+    cache = _llm_cache
+    if cache is None:
+        res = _send(**kwargs)
+    else:
+        key = cache.key(kwargs)
+        res = cache.get(key)
+        if res is None:
+            res = _send(**kwargs)
+            cache.put(key, res)
+    if episode_log is not None:
+        episode_log.record_completion(kwargs, res)
+    return res
+
+
+async def acompletion(**kwargs: Any) -> Any:
+    episode_log = current_episode_log()
+    if episode_log is not None and episode_log.replaying:
+        return episode_log.replay_completion(kwargs)
+    cache = _llm_cache
+    if cache is None:
+        res = await _asend(**kwargs)
+    else:
+        key = cache.key(kwargs)
+        res = cache.get(key)
+        if res is None:
+            res = await _asend(**kwargs)
+            cache.put(key, res)
+    if episode_log is not None:
+        episode_log.record_completion(kwargs, res)
+    return res
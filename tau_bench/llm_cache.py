@@ -0,0 +1,224 @@
+# Copyright Sierra
+
+"""A persistent cache of chat completion responses, stored in SQLite.
+
+Responses are keyed on a hash of the request (model, provider, messages, tools,
+temperature and any other arguments), so the cache can be shared by runs,
+processes and hosts that read the same file. Sampled requests (temperature
+other than 0, or unset) are also keyed on the namespace set with
+`cache_namespace`, which the runner sets to the trial, so that trials of the
+same task do not all receive the same sample, and on how many times the same
+request was sent before in the namespace, so that resending a request to draw
+a new sample (as the verify and reflection user strategies do) gets a new
+response too.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+from hashlib import sha256
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from litellm import ModelResponse
+
+LLM_CACHE_MODES = ["off", "read-write", "read-only", "replay"]
+
+
+class CacheNamespace(object):
+    """A namespace of cache keys, counting the sampled requests sent in it."""
+
+    def __init__(self, name: Optional[str]) -> None:
+        self.name = name
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def occurrence(self, request_hash: str) -> int:
+        """How many times the request was sent before in this namespace."""
+        with self._lock:
+            count = self._counts.get(request_hash, 0)
+            self._counts[request_hash] = count + 1
+        return count
+
+
+_namespace: contextvars.ContextVar[CacheNamespace] = contextvars.ContextVar(
+    "tau_bench_llm_cache_namespace", default=CacheNamespace(None)
+)
+
+
+@contextmanager
+def cache_namespace(namespace: str) -> Iterator[None]:
+    token = _namespace.set(CacheNamespace(namespace))
+    try:
+        yield
+    finally:
+        _namespace.reset(token)
+
+
+def hash_request(request: Dict[str, Any]) -> str:
+    return sha256(
+        json.dumps(request, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode for a request that is not in the cache."""
+
+
+class LLMCache(object):
+    """Completion responses stored in a SQLite file.
+
+    Modes:
+    - `read-write`: serve hits, call the model on misses and store the response
+    - `read-only`: serve hits, call the model on misses without storing anything
+    - `replay`: serve hits, raise `LLMCacheMiss` on misses
+
+    Entries not used for `max_age_days` are evicted, then the least recently
+    used ones until the file holds at most `max_size_mb` of responses.
+    Eviction runs when the cache is opened and every `evict_every` writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "read-write",
+        max_size_mb: Optional[float] = None,
+        max_age_days: Optional[float] = None,
+        evict_every: int = 1000,
+    ) -> None:
+        assert mode in LLM_CACHE_MODES and mode != "off", f"Invalid cache mode: {mode}"
+        self.path = path
+        self.mode = mode
+        self.max_size_mb = max_size_mb
+        self.max_age_days = max_age_days
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._num_writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, response_cost REAL, "
+                "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+            )
+        if self.mode == "read-write":
+            self.evict()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # only used by this thread, but closed by `close` from any thread
+            conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close the connections of all threads; later calls open new ones."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    def key(self, request: Dict[str, Any]) -> str:
+        if request.get("temperature") == 0:
+            return hash_request(request)
+        namespace = _namespace.get()
+        request = dict(request)
+        request["__namespace__"] = namespace.name
+        request["__occurrence__"] = namespace.occurrence(hash_request(request))
+        return hash_request(request)
+
+    def get(self, key: str) -> Optional[ModelResponse]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No cached response for request {key}")
+            return None
+        if self.mode == "read-write":
+            with conn:
+                conn.execute(
+                    "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+        res = ModelResponse(**json.loads(row[0]))
+        # the cached call costs nothing this time
+        res._hidden_params["response_cost"] = 0.0
+        res._hidden_params["cache_hit"] = True
+        return res
+
+    def put(self, key: str, res: ModelResponse) -> None:
+        if self.mode != "read-write":
+            return
+        response = json.dumps(res.model_dump())
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response,
+                    res._hidden_params.get("response_cost"),
+                    len(response),
+                    now,
+                    now,
+                ),
+            )
+        with self._lock:
+            self._num_writes += 1
+            evict = self._num_writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        conn = self._connect()
+        with conn:
+            if self.max_age_days is not None:
+                conn.execute(
+                    "DELETE FROM responses WHERE last_used < ?",
+                    (time.time() - self.max_age_days * 86400,),
+                )
+            if self.max_size_mb is not None:
+                max_size = int(self.max_size_mb * 1024 * 1024)
+                total_size = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+                if total_size > max_size:
+                    rows = conn.execute(
+                        "SELECT key, size FROM responses ORDER BY last_used"
+                    ).fetchall()
+                    evicted = []
+                    for key, size in rows:
+                        if total_size <= max_size:
+                            break
+                        evicted.append((key,))
+                        total_size -= size
+                    conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
@@ -39,6 +39,8 @@ from tau_bench.model_utils.model.exception import ModelError as ModelError
 from tau_bench.model_utils.model.general_model import GeneralModel as GeneralModel
 from tau_bench.model_utils.model.general_model import default_model as default_model
 from tau_bench.model_utils.model.general_model import model_factory as model_factory
+from tau_bench.model_utils.model.http_pool import configure_http_pool as configure_http_pool
+from tau_bench.model_utils.model.http_pool import stats as http_pool_stats
 from tau_bench.model_utils.model.model import BinaryClassifyModel as BinaryClassifyModel
 from tau_bench.model_utils.model.model import ClassifyModel as ClassifyModel
 from tau_bench.model_utils.model.model import GenerateModel as GenerateModel
@@ -7,6 +7,7 @@ from pydantic import BaseModel
 
 from tau_bench.model_utils.api._model_methods import MODEL_METHODS
 from tau_bench.model_utils.api.cache import cache_call_w_dedup
+from tau_bench.model_utils.api.cache import stats as cache_stats
 from tau_bench.model_utils.api.datapoint import (
     BinaryClassifyDatapoint,
     ClassifyDatapoint,
@@ -70,16 +71,22 @@ class API(object):
 
         self.__init_subclass__()
 
-        self.__init_subclass__()
-
     def __init_subclass__(cls):
         for method_name in MODEL_METHODS:
             if hasattr(cls, method_name):
                 method = getattr(cls, method_name)
+                # wrap each method once, not once per instance
+                if getattr(method, "_is_wrapped_main_method", False):
+                    continue
                 for wrapper in cls.wrappers_for_main_methods:
                     method = wrapper(method)
+                method._is_wrapped_main_method = True
                 setattr(cls, method_name, method)
 
+    def cache_stats(self) -> dict[str, int]:
+        """Hits, misses, deduplicated in-flight calls and evictions of the call cache."""
+        return cache_stats.snapshot()
+
     @classmethod
     def from_general_model(
         cls,
@@ -2,7 +2,8 @@ import functools
 import hashlib
 import inspect
 import threading
-from collections import defaultdict
+import time
+from collections import OrderedDict
 from multiprocessing import Lock
 from typing import Any, Callable, TypeVar
 
@@ -12,9 +13,46 @@ T = TypeVar("T")
 
 USE_CACHE = True
 _USE_CACHE_LOCK = Lock()
-cache: dict[str, tuple[T, threading.Event]] = {}
+# max number of cached results, or None for no limit
+MAX_CACHE_SIZE: int | None = 4096
+# seconds after which a cached result expires, or None to keep it until evicted
+CACHE_TTL: float | None = None
+# seconds for which a failure is cached, or None to never cache failures
+NEGATIVE_CACHE_TTL: float | None = None
+
+# key -> (result or exception, is_exception, expiry time or None), in LRU order
+cache: OrderedDict[str, tuple[Any, bool, float | None]] = OrderedDict()
 lock = threading.Lock()
-conditions = defaultdict(threading.Condition)
+# key -> the call currently computing it
+inflight: dict[str, "InflightCall"] = {}
+
+
+class InflightCall(object):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Exception | None = None
+
+
+class CacheStats(object):
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.inflight_dedups = 0
+        self.evictions = 0
+
+    def snapshot(self) -> dict[str, int]:
+        with lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "inflight_dedups": self.inflight_dedups,
+                "evictions": self.evictions,
+                "size": len(cache),
+            }
+
+
+stats = CacheStats()
 
 
 def disable_cache():
@@ -29,9 +67,40 @@ def enable_cache():
         USE_CACHE = True
 
 
+def configure_cache(
+    max_size: int | None = MAX_CACHE_SIZE,
+    ttl: float | None = CACHE_TTL,
+    negative_ttl: float | None = NEGATIVE_CACHE_TTL,
+) -> None:
+    global MAX_CACHE_SIZE, CACHE_TTL, NEGATIVE_CACHE_TTL
+    with lock:
+        MAX_CACHE_SIZE = max_size
+        CACHE_TTL = ttl
+        NEGATIVE_CACHE_TTL = negative_ttl
+        _evict_locked()
+
+
+def clear_cache() -> None:
+    with lock:
+        cache.clear()
+
+
+def _evict_locked() -> None:
+    if MAX_CACHE_SIZE is None:
+        return
+    while len(cache) > MAX_CACHE_SIZE:
+        cache.popitem(last=False)
+        stats.evictions += 1
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_schema(typ: type[BaseModel]) -> int:
+    return hash_item(typ.model_json_schema())
+
+
 def hash_item(item: Any) -> int:
     if isinstance(item, dict):
-        return hash(tuple({k: hash_item(v) for k, v in sorted(item.items())}))
+        return hash(tuple((k, hash_item(v)) for k, v in sorted(item.items())))
     elif isinstance(item, list):
         return hash(tuple([hash_item(x) for x in item]))
     elif isinstance(item, set):
@@ -39,12 +108,19 @@ def hash_item(item: Any) -> int:
     elif isinstance(item, tuple):
         return hash(tuple([hash_item(x) for x in item]))
     elif isinstance(item, BaseModel):
-        return hash_item(item.model_json_schema())
+        return hash((_hash_schema(type(item)), hash_item(item.model_dump())))
+    elif isinstance(item, type) and issubclass(item, BaseModel):
+        return _hash_schema(item)
     return hash(item)
 
 
+@functools.lru_cache(maxsize=None)
+def _signature(func: Callable[..., Any]) -> inspect.Signature:
+    return inspect.signature(func)
+
+
 def hash_func_call(func: Callable[..., Any], args: tuple[Any], kwargs: dict[str, Any]) -> str:
-    bound_args = inspect.signature(func).bind(*args, **kwargs)
+    bound_args = _signature(func).bind(*args, **kwargs)
     bound_args.apply_defaults()
     standardized_args = sorted(bound_args.arguments.items())
     arg_hash = hash_item(standardized_args)
@@ -53,35 +129,68 @@ def hash_func_call(func: Callable[..., Any], args: tuple[Any], kwargs: dict[str,
     return hashlib.md5(str(call).encode()).hexdigest()
 
 
+def _lookup_locked(key: str) -> tuple[Any, bool] | None:
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    result, is_exception, expiry = entry
+    if expiry is not None and expiry <= time.monotonic():
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return result, is_exception
+
+
+def _store_locked(key: str, result: Any, is_exception: bool) -> None:
+    ttl = NEGATIVE_CACHE_TTL if is_exception else CACHE_TTL
+    if is_exception and ttl is None:
+        return
+    cache[key] = (result, is_exception, None if ttl is None else time.monotonic() + ttl)
+    cache.move_to_end(key)
+    _evict_locked()
+
+
 def cache_call_w_dedup(func: Callable[..., T]) -> Callable[..., T]:
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> T:
         if not USE_CACHE:
             return func(*args, **kwargs)
         key = hash_func_call(func=func, args=args, kwargs=kwargs)
-        if key in cache:
-            result, event = cache[key]
-            if event.is_set():
+        with lock:
+            found = _lookup_locked(key)
+            if found is not None:
+                stats.hits += 1
+                result, is_exception = found
+                if is_exception:
+                    raise result
                 return result
-        else:
+            call = inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                stats.misses += 1
+                call = InflightCall()
+                inflight[key] = call
+            else:
+                stats.inflight_dedups += 1
+        if not is_leader:
+            # another caller is computing the same result
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
             with lock:
-                cache[key] = (None, threading.Event())
-
-        condition = conditions[key]
-        with condition:
-            if cache[key][1].is_set():
-                return cache[key][0]
-            if not cache[key][0]:
-                try:
-                    result = func(*args, **kwargs)
-                    with lock:
-                        cache[key] = (result, threading.Event())
-                        cache[key][1].set()
-                except Exception as e:
-                    with lock:
-                        cache[key] = (e, threading.Event())
-                        cache[key][1].set()
-                    raise e
-            return cache[key][0]
+                _store_locked(key, e, True)
+                del inflight[key]
+            call.done.set()
+            raise e
+        with lock:
+            _store_locked(key, call.result, False)
+            del inflight[key]
+        call.done.set()
+        return call.result
 
     return wrapper
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import weakref
+from typing import Any
+
+import httpx
+
+# max number of connections per process, or None for no limit
+MAX_CONNECTIONS: int | None = 64
+# max number of idle connections kept alive, or None for MAX_CONNECTIONS
+MAX_KEEPALIVE_CONNECTIONS: int | None = None
+# whether to use HTTP/2 with servers that support it (requires the h2 package)
+HTTP2 = False
+# seconds to wait for a response; generations can be slow
+TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+lock = threading.Lock()
+_client: httpx.Client | None = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_openai_clients: dict[tuple[str, str], Any] = {}
+_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class PoolStats(object):
+    def __init__(self) -> None:
+        self.requests = 0
+        self.new_connections = 0
+
+    def snapshot(self) -> dict[str, float]:
+        with lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(self.requests - self.new_connections, 0),
+                "reuse_rate": (
+                    1 - self.new_connections / self.requests if self.requests > 0 else 0.0
+                ),
+            }
+
+
+stats = PoolStats()
+
+
+def _count_request() -> None:
+    with lock:
+        stats.requests += 1
+
+
+def _trace(event_name: str, _: dict[str, Any]) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        with lock:
+            stats.new_connections += 1
+
+
+async def _atrace(event_name: str, info: dict[str, Any]) -> None:
+    _trace(event_name, info)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count_request()
+    request.extensions["trace"] = _trace
+
+
+async def _aon_request(request: httpx.Request) -> None:
+    _count_request()
+    request.extensions["trace"] = _atrace
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=(
+            MAX_KEEPALIVE_CONNECTIONS if MAX_KEEPALIVE_CONNECTIONS is not None else MAX_CONNECTIONS
+        ),
+    )
+
+
+def configure_http_pool(
+    max_connections: int | None = MAX_CONNECTIONS,
+    max_keepalive_connections: int | None = MAX_KEEPALIVE_CONNECTIONS,
+    http2: bool = HTTP2,
+) -> None:
+    """Set the pool size and protocol; clients created earlier are closed and replaced."""
+    global MAX_CONNECTIONS, MAX_KEEPALIVE_CONNECTIONS, HTTP2, _client
+    with lock:
+        MAX_CONNECTIONS = max_connections
+        MAX_KEEPALIVE_CONNECTIONS = max_keepalive_connections
+        HTTP2 = http2
+        client, _client = _client, None
+        async_clients = list(_async_clients.items())
+        _async_clients.clear()
+        _openai_clients.clear()
+        _async_openai_clients.clear()
+    if client is not None:
+        client.close()
+    for loop, async_client in async_clients:
+        _close_async_client(loop, async_client)
+
+
+def _close_async_client(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    # the client can only be closed on its own event loop
+    if loop.is_closed():
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        loop.run_until_complete(client.aclose())
+
+
+def get_http_client() -> httpx.Client:
+    """The process-wide pooled client, for synchronous requests."""
+    global _client
+    with lock:
+        if _client is None:
+            _client = httpx.Client(
+                limits=_limits(),
+                http2=HTTP2,
+                timeout=TIMEOUT,
+                event_hooks={"request": [_on_request]},
+            )
+        return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The pooled client of the running event loop, for asynchronous requests."""
+    # async connections are bound to the event loop that opened them
+    loop = asyncio.get_running_loop()
+    with lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(
+                limits=_limits(),
+                http2=HTTP2,
+                timeout=TIMEOUT,
+                event_hooks={"request": [_aon_request]},
+            )
+        return client
+
+
+def get_openai_client(base_url: str, api_key: str) -> Any:
+    """A shared OpenAI client for an OpenAI-compatible server, on the pooled client."""
+    from openai import OpenAI
+
+    http_client = get_http_client()
+    with lock:
+        client = _openai_clients.get((base_url, api_key))
+        if client is None:
+            client = _openai_clients[(base_url, api_key)] = OpenAI(
+                base_url=base_url, api_key=api_key, http_client=http_client
+            )
+        return client
+
+
+def get_async_openai_client(base_url: str, api_key: str) -> Any:
+    """The same for asynchronous requests, on the running event loop's pooled client."""
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    http_client = get_async_http_client()
+    with lock:
+        clients = _async_openai_clients.setdefault(loop, {})
+        client = clients.get((base_url, api_key))
+        if client is None:
+            client = clients[(base_url, api_key)] = AsyncOpenAI(
+                base_url=base_url, api_key=api_key, http_client=http_client
+            )
+        return client
@@ -1,7 +1,10 @@
+from typing import Any
+
 from tau_bench.model_utils.api.datapoint import Datapoint
 from tau_bench.model_utils.model.chat import ChatModel, Message
 from tau_bench.model_utils.model.completion import approx_cost_for_datapoint, approx_prompt_str
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_pool import get_async_openai_client, get_openai_client
 from tau_bench.model_utils.model.utils import approx_num_tokens
 
 PRICE_PER_INPUT_TOKEN_MAP = {
@@ -59,17 +62,9 @@ class VLLMChatModel(ChatModel):
         latency_ms_per_output_token: float | None = None,
         max_context_length: int | None = None,
     ) -> None:
-        from openai import AsyncOpenAI, OpenAI
-
         self.model = model
-        self.client = OpenAI(
-            base_url=base_url,
-            api_key=api_key,
-        )
-        self.async_client = AsyncOpenAI(
-            base_url=base_url,
-            api_key=api_key,
-        )
+        self.base_url = base_url
+        self.api_key = api_key
         self.temperature = temperature
         self.price_per_input_token = (
             price_per_input_token
@@ -92,6 +87,15 @@ class VLLMChatModel(ChatModel):
             else MAX_CONTEXT_LENGTH_MAP.get(model, MAX_CONTEXT_LENGTH_FALLBACK)
         )
 
+    # looked up on each use, since configure_http_pool replaces the clients
+    @property
+    def client(self) -> Any:
+        return get_openai_client(base_url=self.base_url, api_key=self.api_key)
+
+    @property
+    def async_client(self) -> Any:
+        return get_async_openai_client(base_url=self.base_url, api_key=self.api_key)
+
     def get_approx_cost(self, dp: Datapoint) -> float:
         cost_per_token = self.price_per_input_token
         return approx_cost_for_datapoint(dp=dp, price_per_input_token=cost_per_token)
@@ -1,8 +1,7 @@
 from typing import Any
 
-import requests
-
 from tau_bench.model_utils.model.general_model import wrap_temperature
+from tau_bench.model_utils.model.http_pool import get_http_client
 
 
 def generate_request(
@@ -21,7 +20,7 @@ def generate_request(
     if force_json:
         # the prompt will have a suffix of '```json\n' to indicate that the response should be a JSON object
         args["stop"] = ["```"]
-    res = requests.post(
+    res = get_http_client().post(
         url,
         json=args,
     )
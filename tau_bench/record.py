@@ -0,0 +1,147 @@
+# Copyright Sierra
+
+"""Record and replay the model calls and tool calls of whole episodes.
+
+A recording is a JSONL file with one line per episode, listing in order every
+model response (with a hash of its request) and every tool observation. When
+replaying, model calls are answered from the recording instead of a server,
+and each request and tool observation is checked against the recorded one, so
+a replay either reproduces the recorded trajectories and rewards exactly or
+fails with `ReplayDivergence` at the first difference.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from litellm import ModelResponse
+
+from tau_bench.checkpoint import CheckpointWriter, get_stream_path, load_checkpoint
+from tau_bench.llm_cache import hash_request
+
+_current_episode: contextvars.ContextVar[Optional["EpisodeLog"]] = contextvars.ContextVar(
+    "tau_bench_episode_log", default=None
+)
+
+
+class ReplayDivergence(Exception):
+    pass
+
+
+class EpisodeLog(object):
+    def __init__(
+        self, episode: str, replay_events: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        self.episode = episode
+        self.replaying = replay_events is not None
+        self.events: List[Dict[str, Any]] = (
+            replay_events if replay_events is not None else []
+        )
+        self._cursor = 0
+
+    def _next_event(self, kind: str) -> Dict[str, Any]:
+        if self._cursor >= len(self.events):
+            raise ReplayDivergence(
+                f"{self.episode}: the recording has no more events, expected a {kind} event"
+            )
+        event = self.events[self._cursor]
+        self._cursor += 1
+        if event["type"] != kind:
+            raise ReplayDivergence(
+                f"{self.episode}: event {self._cursor - 1} is a {event['type']} event in the recording, got a {kind} event"
+            )
+        return event
+
+    def replay_completion(self, request: Dict[str, Any]) -> ModelResponse:
+        event = self._next_event("llm")
+        if event["request_hash"] != hash_request(request):
+            raise ReplayDivergence(
+                f"{self.episode}: request {self._cursor - 1} differs from the recording"
+            )
+        res = ModelResponse(**event["response"])
+        res._hidden_params["response_cost"] = event["response_cost"]
+        return res
+
+    def record_completion(self, request: Dict[str, Any], res: Any) -> None:
+        self.events.append(
+            {
+                "type": "llm",
+                "model": request.get("model"),
+                "request_hash": hash_request(request),
+                "response": res.model_dump(),
+                "response_cost": res._hidden_params.get("response_cost"),
+            }
+        )
+
+    def tool_call(self, name: str, kwargs: Dict[str, Any], observation: str) -> None:
+        if not self.replaying:
+            self.events.append(
+                {"type": "tool", "name": name, "kwargs": kwargs, "observation": observation}
+            )
+            return
+        event = self._next_event("tool")
+        if (event["name"], event["kwargs"], event["observation"]) != (
+            name,
+            kwargs,
+            observation,
+        ):
+            raise ReplayDivergence(
+                f"{self.episode}: tool call {name} differs from the recording"
+            )
+
+
+def current_episode_log() -> Optional[EpisodeLog]:
+    return _current_episode.get()
+
+
+@contextmanager
+def no_episode_log() -> Iterator[None]:
+    """Neither record nor replay the enclosed block, e.g. internal replays."""
+    token = _current_episode.set(None)
+    try:
+        yield
+    finally:
+        _current_episode.reset(token)
+
+
+class Recorder(object):
+    """Appends the log of each episode run under `episode` to a JSONL file."""
+
+    def __init__(self, path: str) -> None:
+        self.writer = CheckpointWriter(path)
+
+    @contextmanager
+    def episode(self, episode: str) -> Iterator[EpisodeLog]:
+        log = EpisodeLog(episode)
+        token = _current_episode.set(log)
+        try:
+            yield log
+        finally:
+            _current_episode.reset(token)
+            self.writer.write({"episode": episode, "events": log.events})
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class Replayer(object):
+    """Serves the model calls of episodes from a file written by `Recorder`."""
+
+    def __init__(self, path: str) -> None:
+        self.episodes: Dict[str, List[Dict[str, Any]]] = {
+            r["episode"]: r["events"] for r in load_checkpoint(get_stream_path(path))
+        }
+
+    @contextmanager
+    def episode(self, episode: str) -> Iterator[EpisodeLog]:
+        if episode not in self.episodes:
+            raise ReplayDivergence(f"{episode} is not in the recording")
+        log = EpisodeLog(episode, replay_events=self.episodes[episode])
+        token = _current_episode.set(log)
+        try:
+            yield log
+        finally:
+            _current_episode.reset(token)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,226 @@
+# Copyright Sierra
+
+"""Retries, timeouts and circuit breaking for model calls.
+
+`call_with_retries` and `acall_with_retries` retry transient errors (rate
+limits, timeouts, overloaded or unreachable servers) with jittered exponential
+backoff, up to `max_retries` times per call and as long as the endpoint's
+retry budget allows: retries may add at most `budget_ratio` of the endpoint's
+calls, plus `min_budget`, so that a failing server is not flooded with retries.
+
+Each endpoint (provider, model and API base) has a circuit breaker, which opens
+after `failure_threshold` consecutive transient errors. Calls to an open
+endpoint wait for it to half-open after `reset_timeout` seconds, when a single
+call probes it, instead of failing the episode; calls that would wait longer
+than `max_open_wait` seconds in total raise `CircuitOpenError`.
+
+Retries, timeouts and waits are counted in the active episode's trace.
+"""
+
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import litellm
+
+from tau_bench.tracing import count
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.Timeout,
+    litellm.ServiceUnavailableError,
+    litellm.InternalServerError,
+    litellm.BadGatewayError,
+    litellm.APIConnectionError,
+)
+
+LLM_RETRIES = "llm_retries"
+LLM_TIMEOUTS = "llm_timeouts"
+LLM_CIRCUIT_WAITS = "llm_circuit_waits"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryPolicy(object):
+    def __init__(
+        self,
+        max_retries: int = 4,
+        timeout: Optional[float] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        budget_ratio: float = 0.2,
+        min_budget: int = 10,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_open_wait: float = 600.0,
+    ) -> None:
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_budget = min_budget
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_open_wait = max_open_wait
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter": spreads out the retries of calls that failed together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def request_options(self) -> Dict[str, Any]:
+        # retries are handled here rather than by litellm or the provider SDK
+        options: Dict[str, Any] = {"max_retries": 0}
+        if self.timeout is not None:
+            options["timeout"] = self.timeout
+        return options
+
+
+class Endpoint(object):
+    """The circuit breaker and retry budget of one model endpoint."""
+
+    def __init__(self, policy: RetryPolicy) -> None:
+        self.policy = policy
+        self.num_calls = 0
+        self.num_retries = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds to wait before calling, 0 to call now."""
+        with self._lock:
+            if self.opened_at is None:
+                self.num_calls += 1
+                return 0.0
+            remaining = self.opened_at + self.policy.reset_timeout - time.time()
+            if remaining > 0:
+                return remaining
+            now = time.time()
+            # a probe that never reported back (e.g. cancelled) is given up on
+            if self.probe_started is not None and now - self.probe_started < self.policy.reset_timeout:
+                return min(1.0, self.policy.reset_timeout)
+            # half-open: let one call through to probe the endpoint
+            self.probe_started = now
+            self.num_calls += 1
+            return 0.0
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            if self.num_retries >= self.policy.min_budget + self.policy.budget_ratio * self.num_calls:
+                return False
+            self.num_retries += 1
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if (
+                self.probe_started is not None
+                or self.consecutive_failures >= self.policy.failure_threshold
+            ):
+                self.opened_at = time.time()
+            self.probe_started = None
+
+
+_endpoints: Dict[Tuple[Any, ...], Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(request: Dict[str, Any], policy: RetryPolicy) -> Endpoint:
+    key = (
+        request.get("custom_llm_provider"),
+        request.get("model"),
+        request.get("api_base") or request.get("base_url"),
+    )
+    with _endpoints_lock:
+        endpoint = _endpoints.get(key)
+        if endpoint is None:
+            endpoint = _endpoints[key] = Endpoint(policy)
+        return endpoint
+
+
+def _on_error(
+    endpoint: Endpoint, policy: RetryPolicy, e: Exception, attempt: int
+) -> Optional[float]:
+    """Seconds to wait before retrying after `e`, or None to raise it."""
+    if not isinstance(e, RETRYABLE_ERRORS):
+        # the endpoint answered, even if with an error
+        endpoint.record_success()
+        return None
+    endpoint.record_failure()
+    if isinstance(e, litellm.Timeout):
+        count(LLM_TIMEOUTS)
+    if attempt >= policy.max_retries or not endpoint.try_retry():
+        return None
+    count(LLM_RETRIES)
+    return policy.backoff(attempt)
+
+
+def call_with_retries(
+    call: Callable[..., T], request: Dict[str, Any], policy: RetryPolicy
+) -> T:
+    endpoint = get_endpoint(request, policy)
+    attempt = 0
+    open_wait = 0.0
+    while True:
+        wait = endpoint.wait_time()
+        if wait > 0:
+            if open_wait + wait > policy.max_open_wait:
+                raise CircuitOpenError(f"Circuit open for model {request.get('model')}")
+            count(LLM_CIRCUIT_WAITS)
+            open_wait += wait
+            time.sleep(wait)
+            continue
+        try:
+            res = call(**{**policy.request_options(), **request})
+        except Exception as e:
+            delay = _on_error(endpoint, policy, e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        endpoint.record_success()
+        return res
+
+
+async def acall_with_retries(
+    call: Callable[..., Awaitable[T]], request: Dict[str, Any], policy: RetryPolicy
+) -> T:
+    endpoint = get_endpoint(request, policy)
+    attempt = 0
+    open_wait = 0.0
+    while True:
+        wait = endpoint.wait_time()
+        if wait > 0:
+            if open_wait + wait > policy.max_open_wait:
+                raise CircuitOpenError(f"Circuit open for model {request.get('model')}")
+            count(LLM_CIRCUIT_WAITS)
+            open_wait += wait
+            await asyncio.sleep(wait)
+            continue
+        try:
+            res = await call(**{**policy.request_options(), **request})
+        except Exception as e:
+            delay = _on_error(endpoint, policy, e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        endpoint.record_success()
+        return res
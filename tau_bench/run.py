@@ -2,17 +2,59 @@
 
 import os
 import json
+import asyncio
 import random
 import traceback
 from math import comb
 import multiprocessing
-from typing import List, Dict, Any
+from contextlib import nullcontext
+from typing import List, Dict, Any, ContextManager, Optional, Tuple, Union
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
 from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+from tau_bench.envs.pool import EnvPool
 from tau_bench.agents.base import Agent
-from tau_bench.types import EnvRunResult, RunConfig
+from tau_bench.checkpoint import (
+    CheckpointWriter,
+    get_shard_path,
+    get_stream_path,
+    load_resumable_results,
+    merge_shards,
+)
+from tau_bench.concurrency import (
+    AdaptiveLimiter,
+    get_concurrency_limiter,
+    set_concurrency_limiter,
+)
+from tau_bench.coalesce import RequestCoalescer
+from tau_bench.llm import (
+    async_http_pool,
+    clear_http_pool,
+    get_request_coalescer,
+    set_http_pool,
+    set_llm_cache,
+    set_request_coalescer,
+    set_retry_policy,
+)
+from tau_bench.llm_cache import LLM_CACHE_MODES, LLMCache, cache_namespace
+from tau_bench.record import Recorder, Replayer
+from tau_bench.retry import LLM_CIRCUIT_WAITS, LLM_RETRIES, LLM_TIMEOUTS, RetryPolicy
+from tau_bench.token_utils import (
+    CONTEXT_MODES,
+    DEFAULT_MAX_CONTEXT_LENGTH,
+    set_max_context_length,
+    set_tokenizer,
+)
+from tau_bench.tracing import (
+    EPISODE,
+    Tracer,
+    export_chrome_trace,
+    span,
+    summarize_traces,
+)
+from tau_bench.types import EnvRunResult, RunConfig, SolveResult
 from litellm import provider_list
 from tau_bench.envs.user import UserStrategy
 
@@ -24,23 +66,87 @@ def run(config: RunConfig) -> List[EnvRunResult]:
     assert config.agent_strategy in ["tool-calling", "act", "react", "few-shot"], "Invalid agent strategy"
     assert config.task_split in ["train", "test", "dev", "think"], "Invalid task split"
     assert config.user_strategy in [item.value for item in UserStrategy], "Invalid user strategy"
+    assert config.runtime in ["thread", "async"], "Invalid runtime"
+    assert config.context_mode in CONTEXT_MODES, "Invalid context mode"
+    assert config.llm_cache_mode in LLM_CACHE_MODES, "Invalid LLM cache mode"
+    assert 1 <= config.min_concurrency <= config.max_concurrency, "Invalid concurrency bounds"
+    assert config.llm_max_retries >= 0, "Invalid number of retries"
+    assert config.llm_max_connections is None or config.llm_max_connections >= 1, "Invalid number of connections"
+    assert config.num_shards >= 1, "Invalid number of shards"
+    assert config.shard_index is None or 0 <= config.shard_index < config.num_shards, "Invalid shard index"
+    assert config.resume_path is None or config.num_shards == 1, "Resuming a sharded run is not supported"
+    assert config.record_path is None or config.replay_path is None, "Cannot record and replay at once"
+    assert (config.record_path is None and config.replay_path is None) or config.num_shards == 1, "Recording or replaying a sharded run is not supported"
 
     random.seed(config.seed)
-    time_str = datetime.now().strftime("%m%d%H%M%S")
+    set_tokenizer(config.tokenizer)
+    # settings of an earlier run in this process are reset too
+    set_max_context_length(
+        config.max_context_length
+        if config.max_context_length is not None
+        else DEFAULT_MAX_CONTEXT_LENGTH
+    )
+    set_retry_policy(
+        RetryPolicy(max_retries=config.llm_max_retries, timeout=config.llm_timeout)
+    )
+    set_request_coalescer(RequestCoalescer() if config.coalesce_requests else None)
+    if config.llm_max_connections is not None or config.llm_http2:
+        set_http_pool(max_connections=config.llm_max_connections, http2=config.llm_http2)
+    else:
+        clear_http_pool()
+    # the launcher of a sharded run makes no model calls, each shard opens the cache
+    launch_shards = config.num_shards > 1 and config.shard_index is None
+    llm_cache = None
+    if (
+        config.llm_cache_path is not None
+        and config.llm_cache_mode != "off"
+        and not launch_shards
+    ):
+        llm_cache = LLMCache(
+            config.llm_cache_path,
+            mode=config.llm_cache_mode,
+            max_size_mb=config.llm_cache_max_size_mb,
+            max_age_days=config.llm_cache_max_age_days,
+        )
+    # also replaces the cache of an earlier run in this process
+    set_llm_cache(llm_cache)
+    run_name = config.run_name or datetime.now().strftime("%m%d%H%M%S")
     safe_model_name = config.model.replace("/", "_")
     safe_user_model_name = config.user_model.replace("/", "_")
-    ckpt_path = f"{config.log_dir}/{config.agent_strategy}-{safe_model_name}-{config.temperature}_range_{config.start_index}-{config.end_index}_user-{safe_user_model_name}-{config.user_strategy}_{time_str}.json"
+    ckpt_path = f"{config.log_dir}/{config.agent_strategy}-{safe_model_name}-{config.temperature}_range_{config.start_index}-{config.end_index}_user-{safe_user_model_name}-{config.user_strategy}_{run_name}.json"
+    if config.resume_path is not None:
+        ckpt_path = os.path.splitext(config.resume_path)[0] + ".json"
     if not os.path.exists(config.log_dir):
         os.makedirs(config.log_dir)
 
+    if launch_shards:
+        run_shards_locally(config.model_copy(update={"run_name": run_name}))
+        shard_paths = [
+            get_shard_path(ckpt_path, shard_index, config.num_shards)
+            for shard_index in range(config.num_shards)
+        ]
+        results = [EnvRunResult(**r) for r in merge_shards(shard_paths, ckpt_path)]
+        display_metrics(results)
+        display_latency(results, config.trace_path)
+        print(f"\n📄 Results saved to {ckpt_path}\n")
+        return results
+
+    recording = None
+    if config.record_path is not None:
+        recording = Recorder(config.record_path)
+    elif config.replay_path is not None:
+        recording = Replayer(config.replay_path)
+
     print(f"Loading user with strategy: {config.user_strategy}")
-    env = get_env(
-        config.env,
-        user_strategy=config.user_strategy,
-        user_model=config.user_model,
-        user_provider=config.user_model_provider,
-        task_split=config.task_split,
-    )
+    with recording.episode("setup") if recording is not None else nullcontext():
+        env = get_env(
+            config.env,
+            user_strategy=config.user_strategy,
+            user_model=config.user_model,
+            user_provider=config.user_model_provider,
+            task_split=config.task_split,
+            compact_data=config.compact_data,
+        )
     agent = agent_factory(
         tools_info=env.tools_info,
         wiki=env.wiki,
@@ -49,78 +155,242 @@ def run(config: RunConfig) -> List[EnvRunResult]:
     end_index = (
         len(env.tasks) if config.end_index == -1 else min(config.end_index, len(env.tasks))
     )
-    results: List[EnvRunResult] = []
-    lock = multiprocessing.Lock()
+    schedule = get_schedule(config, end_index)
+    previous_results: List[EnvRunResult] = []
+    if config.resume_path is not None:
+        previous_results = [EnvRunResult(**r) for r in load_resumable_results(ckpt_path)]
+        completed = set((r.task_id, r.trial) for r in previous_results)
+        schedule = [(trial, idx) for trial, idx in schedule if (idx, trial) not in completed]
+        print(
+            f"Resuming from {ckpt_path}: {len(completed)} completed, {len(schedule)} remaining"
+        )
+    if config.shard_index is not None:
+        schedule = schedule[config.shard_index :: config.num_shards]
+        # sharded runs are not resumed, so results of an earlier run of the
+        # shard would be merged twice
+        writer = CheckpointWriter(
+            get_shard_path(ckpt_path, config.shard_index, config.num_shards),
+            truncate=True,
+        )
+    else:
+        # checked before the writer thread creates the stream
+        seed_stream = bool(previous_results) and not os.path.exists(
+            get_stream_path(ckpt_path)
+        )
+        writer = CheckpointWriter(ckpt_path)
+        if seed_stream:
+            # resuming from a compacted checkpoint: seed the stream with it
+            for result in previous_results:
+                writer.write(result.model_dump())
     if config.task_ids and len(config.task_ids) > 0:
-        print(f"Running tasks {config.task_ids} (checkpoint path: {ckpt_path})")
+        print(f"Running tasks {config.task_ids} (checkpoint path: {writer.stream_path})")
     else:
         print(
-            f"Running tasks {config.start_index} to {end_index} (checkpoint path: {ckpt_path})"
+            f"Running tasks {config.start_index} to {end_index} (checkpoint path: {writer.stream_path})"
     )
+    try:
+        limiter = None
+        if config.adaptive_concurrency:
+            limiter = AdaptiveLimiter(
+                min_limit=config.min_concurrency, max_limit=config.max_concurrency
+            )
+        set_concurrency_limiter(limiter)
+        results = previous_results + run_schedule(config, agent, schedule, writer, recording)
+        if limiter is not None:
+            display_concurrency(
+                limiter,
+                config.concurrency_log_path
+                or os.path.splitext(writer.stream_path)[0] + "_concurrency.json",
+            )
+        if llm_cache is not None:
+            stats = llm_cache.stats()
+            print(f"🗃️ LLM cache ({stats['mode']}): {stats['hits']} hits, {stats['misses']} misses")
+        coalescer = get_request_coalescer()
+        if coalescer is not None:
+            stats = coalescer.stats()
+            print(f"🔗 Coalesced requests: {stats['coalesced']} shared, {stats['sent']} sent")
+
+        if config.shard_index is not None:
+            # shards are merged into the checkpoint by the launcher or by merge_shards.py
+            writer.close()
+            print(f"\n📄 Shard results saved to {writer.stream_path}\n")
+            return results
+
+        display_metrics(results)
+        display_latency(results, config.trace_path)
+
+        writer.compact([result.model_dump() for result in results])
+        print(f"\n📄 Results saved to {ckpt_path}\n")
+        return results
+    finally:
+        # later model calls in this process must not report to this run's limiter
+        set_concurrency_limiter(None)
+        set_llm_cache(None)
+        if llm_cache is not None:
+            llm_cache.close()
+        # flush the results and episodes already queued, also if the run fails
+        # or is interrupted
+        try:
+            writer.close()
+        finally:
+            if recording is not None:
+                recording.close()
+
+
+def get_schedule(config: RunConfig, end_index: int) -> List[Tuple[int, int]]:
+    """Return the (trial, task index) pairs to run, in order."""
+    schedule = []
     for i in range(config.num_trials):
         if config.task_ids and len(config.task_ids) > 0:
-            idxs = config.task_ids
+            idxs = list(config.task_ids)
         else:
             idxs = list(range(config.start_index, end_index))
         if config.shuffle:
             random.shuffle(idxs)
+        schedule.extend((i, idx) for idx in idxs)
+    return schedule
 
-        def _run(idx: int) -> EnvRunResult:
-            isolated_env = get_env(
-                config.env,
-                user_strategy=config.user_strategy,
-                user_model=config.user_model,
-                task_split=config.task_split,
-                user_provider=config.user_model_provider,
-                task_index=idx,
-            )
 
-            print(f"Running task {idx}")
-            try:
-                res = agent.solve(
-                    env=isolated_env,
-                    task_index=idx,
-                )
-                result = EnvRunResult(
-                    task_id=idx,
-                    reward=res.reward,
-                    info=res.info,
-                    traj=res.messages,
-                    trial=i,
-                )
-            except Exception as e:
-                result = EnvRunResult(
-                    task_id=idx,
-                    reward=0.0,
-                    info={"error": str(e), "traceback": traceback.format_exc()},
-                    traj=[],
-                    trial=i,
-                )
-            print(
-                "✅" if result.reward == 1 else "❌",
-                f"task_id={idx}",
-                result.info,
-            )
-            print("-----")
-            with lock:
-                data = []
-                if os.path.exists(ckpt_path):
-                    with open(ckpt_path, "r") as f:
-                        data = json.load(f)
-                with open(ckpt_path, "w") as f:
-                    json.dump(data + [result.model_dump()], f, indent=2)
-            return result
+def run_shards_locally(config: RunConfig) -> None:
+    """Run each shard of the schedule in its own process."""
+    ctx = multiprocessing.get_context("spawn")
+    processes = []
+    for shard_index in range(config.num_shards):
+        shard_config = config.model_copy(update={"shard_index": shard_index})
+        process = ctx.Process(target=run, args=(shard_config,), name=f"shard-{shard_index}")
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+    failed = [process.name for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Shard processes failed: {failed}")
 
-        with ThreadPoolExecutor(max_workers=config.max_concurrency) as executor:
-            res = list(executor.map(_run, idxs))
-            results.extend(res)
 
-    display_metrics(results)
+def run_schedule(
+    config: RunConfig,
+    agent: Agent,
+    schedule: List[Tuple[int, int]],
+    writer: CheckpointWriter,
+    recording: Optional[Union[Recorder, Replayer]] = None,
+) -> List[EnvRunResult]:
+    def _make_env() -> Env:
+        # the agent resets the env to the episode's task
+        return get_env(
+            config.env,
+            user_strategy=config.user_strategy,
+            user_model=config.user_model,
+            task_split=config.task_split,
+            user_provider=config.user_model_provider,
+            task_index=0,
+            compact_data=config.compact_data,
+        )
 
-    with open(ckpt_path, "w") as f:
-        json.dump([result.model_dump() for result in results], f, indent=2)
-        print(f"\n📄 Results saved to {ckpt_path}\n")
-    return results
+    env_pool = EnvPool(_make_env, max_size=config.max_concurrency)
+
+    def _episode(trial: int, idx: int) -> ContextManager[Any]:
+        if recording is None:
+            return nullcontext()
+        return recording.episode(f"task-{idx}-trial-{trial}")
+
+    def _error_result(
+        trial: int, idx: int, e: Exception, tracer: Tracer
+    ) -> EnvRunResult:
+        return EnvRunResult(
+            task_id=idx,
+            reward=0.0,
+            info={
+                "error": str(e),
+                "traceback": traceback.format_exc(),
+                "trace": tracer.summary(),
+            },
+            traj=[],
+            trial=trial,
+        )
+
+    def _finish(
+        trial: int, idx: int, res: SolveResult, tracer: Tracer
+    ) -> EnvRunResult:
+        return EnvRunResult(
+            task_id=idx,
+            reward=res.reward,
+            info={**res.info, "trace": tracer.summary()},
+            traj=res.messages,
+            trial=trial,
+        )
+
+    def _record(result: EnvRunResult) -> EnvRunResult:
+        print(
+            "✅" if result.reward == 1 else "❌",
+            f"task_id={result.task_id}",
+            # the spans are saved with the result but too noisy to print
+            {k: v for k, v in result.info.items() if k != "trace"},
+        )
+        print("-----")
+        writer.write(result.model_dump())
+        return result
+
+    limiter = get_concurrency_limiter()
+
+    def _run(item: Tuple[int, int]) -> EnvRunResult:
+        trial, idx = item
+        tracer = Tracer()
+        with limiter.slot() if limiter is not None else nullcontext():
+            with tracer.activate(), cache_namespace(f"trial-{trial}"), _episode(trial, idx):
+                isolated_env = env_pool.acquire()
+
+                print(f"Running task {idx}")
+                try:
+                    with span(EPISODE):
+                        res = agent.solve(
+                            env=isolated_env,
+                            task_index=idx,
+                        )
+                    result = _finish(trial, idx, res, tracer)
+                except Exception as e:
+                    result = _error_result(trial, idx, e, tracer)
+                finally:
+                    env_pool.release(isolated_env)
+        return _record(result)
+
+    async def _arun(item: Tuple[int, int], semaphore: asyncio.Semaphore) -> EnvRunResult:
+        trial, idx = item
+        tracer = Tracer()
+        async with limiter.aslot() if limiter is not None else semaphore:
+            with tracer.activate(), cache_namespace(f"trial-{trial}"), _episode(trial, idx):
+                isolated_env = await asyncio.to_thread(env_pool.acquire)
+
+                print(f"Running task {idx}")
+                try:
+                    with span(EPISODE):
+                        res = await agent.asolve(
+                            env=isolated_env,
+                            task_index=idx,
+                        )
+                    result = _finish(trial, idx, res, tracer)
+                except Exception as e:
+                    result = _error_result(trial, idx, e, tracer)
+                finally:
+                    env_pool.release(isolated_env)
+            return _record(result)
+
+    async def _run_all_async() -> List[EnvRunResult]:
+        # blocking fallbacks (env construction, sync-only user simulators)
+        # run on the default executor, so size it like the thread runtime
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=config.max_concurrency)
+        )
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        async with async_http_pool():
+            return await asyncio.gather(*[_arun(item, semaphore) for item in schedule])
+
+    try:
+        if config.runtime == "async":
+            return asyncio.run(_run_all_async())
+        with ThreadPoolExecutor(max_workers=config.max_concurrency) as executor:
+            return list(executor.map(_run, schedule))
+    finally:
+        env_pool.close()
 
 
 def agent_factory(
@@ -136,6 +406,7 @@ def agent_factory(
             model=config.model,
             provider=config.model_provider,
             temperature=config.temperature,
+            context_mode=config.context_mode,
         )
     elif config.agent_strategy == "act":
         # `act` from https://arxiv.org/abs/2210.03629
@@ -148,6 +419,7 @@ def agent_factory(
             provider=config.model_provider,
             use_reasoning=False,
             temperature=config.temperature,
+            context_mode=config.context_mode,
         )
     elif config.agent_strategy == "react":
         # `react` from https://arxiv.org/abs/2210.03629
@@ -160,6 +432,7 @@ def agent_factory(
             provider=config.model_provider,
             use_reasoning=True,
             temperature=config.temperature,
+            context_mode=config.context_mode,
         )
     elif config.agent_strategy == "few-shot":
         from tau_bench.agents.few_shot_agent import FewShotToolCallingAgent
@@ -174,6 +447,7 @@ def agent_factory(
             provider=config.model_provider,
             few_shot_displays=few_shot_displays,
             temperature=config.temperature,
+            context_mode=config.context_mode,
         )
     else:
         raise ValueError(f"Unknown agent strategy: {config.agent_strategy}")
@@ -203,3 +477,53 @@ def display_metrics(results: List[EnvRunResult]) -> None:
     print("📈 Pass^k")
     for k, pass_hat_k in pass_hat_ks.items():
         print(f"  k={k}: {pass_hat_k}")
+
+
+def display_concurrency(limiter: AdaptiveLimiter, path: str) -> None:
+    summary = limiter.summary()
+    print(
+        f"⚖️ Concurrency limit: final {summary['limit']}, "
+        f"range {summary['min_limit_reached']}-{summary['max_limit_reached']}, "
+        f"{summary['num_changes']} changes"
+    )
+    with open(path, "w") as f:
+        json.dump(summary["trajectory"], f, indent=2)
+    print(f"📈 Concurrency limit trajectory saved to {path}")
+
+
+def display_latency(results: List[EnvRunResult], trace_path: Optional[str] = None) -> None:
+    traces = [
+        {"label": f"task {r.task_id}, trial {r.trial}", **r.info["trace"]}
+        for r in results
+        if "trace" in r.info
+    ]
+    contexts = [r.info["context"] for r in results if "context" in r.info]
+    if len(contexts) > 0:
+        prompt_tokens = sum(c["prompt_tokens"] for c in contexts)
+        cached_prompt_tokens = sum(c["cached_prompt_tokens"] for c in contexts)
+        print(
+            f"🗄️ Expected prefix cache hit rate ({contexts[0]['mode']} context): "
+            f"{cached_prompt_tokens / prompt_tokens if prompt_tokens else 0.0:.3f}"
+        )
+    if len(traces) == 0:
+        return
+    counters: Dict[str, int] = {}
+    for trace in traces:
+        for name, n in trace.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + n
+    if len(counters) > 0:
+        retried = sum(1 for trace in traces if trace.get("counters", {}).get(LLM_RETRIES))
+        print(
+            f"🔁 Model calls: {counters.get(LLM_RETRIES, 0)} retries in {retried} episodes, "
+            f"{counters.get(LLM_TIMEOUTS, 0)} timeouts, "
+            f"{counters.get(LLM_CIRCUIT_WAITS, 0)} waits on an open circuit"
+        )
+    print("⏱️ Latency per phase (seconds)")
+    for name, stats in summarize_traces(traces).items():
+        print(
+            f"  {name}: n={stats['count']} total={stats['total']:.2f} "
+            f"p50={stats['p50']:.3f} p95={stats['p95']:.3f} p99={stats['p99']:.3f}"
+        )
+    if trace_path is not None:
+        export_chrome_trace(traces, trace_path)
+        print(f"📊 Trace saved to {trace_path}")
@@ -1,12 +1,24 @@
 # Copyright Sierra
 
 import json
-from typing import List, Dict, Any, Optional
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Dict, Any, Optional, Tuple
+
+from tau_bench.tracing import TRUNCATE, traced
 
 # Default max context length for the deployed model
 DEFAULT_MAX_CONTEXT_LENGTH = 4096
 # Reserve tokens for the model's response
 RESPONSE_TOKEN_RESERVE = 1024
+# Per-message overhead for the role and chat template tokens
+MESSAGE_TOKEN_OVERHEAD = 4
+# Conversation messages kept at the start of the prompt by `elide_messages`
+DEFAULT_NUM_PINNED_MESSAGES = 4
+# Number of messages `elide_messages` drops at a time
+DEFAULT_ELISION_CHUNK_SIZE = 8
+
+CONTEXT_MODES = ["truncate", "prefix-stable"]
 
 
 def estimate_token_count(text: str) -> int:
@@ -14,28 +26,123 @@ def estimate_token_count(text: str) -> int:
     return len(text) // 5 + 1
 
 
+def _count_message_tokens(msg: Dict[str, Any], count_text: Callable[[str], int]) -> int:
+    # role overhead
+    total = MESSAGE_TOKEN_OVERHEAD
+    content = msg.get("content") or ""
+    total += count_text(str(content))
+    # tool_calls in assistant messages
+    if "tool_calls" in msg and msg["tool_calls"]:
+        total += count_text(json.dumps(msg["tool_calls"]))
+    # function_call
+    if "function_call" in msg and msg["function_call"]:
+        total += count_text(json.dumps(msg["function_call"]))
+    return total
+
+
 def estimate_messages_tokens(messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> int:
     """Estimate total tokens for a list of messages and optional tools definition."""
-    total = 0
-    for msg in messages:
-        # role overhead
-        total += 4
-        content = msg.get("content") or ""
-        total += estimate_token_count(str(content))
-        # tool_calls in assistant messages
-        if "tool_calls" in msg and msg["tool_calls"]:
-            total += estimate_token_count(json.dumps(msg["tool_calls"]))
-        # function_call
-        if "function_call" in msg and msg["function_call"]:
-            total += estimate_token_count(json.dumps(msg["function_call"]))
+    total = sum(_count_message_tokens(msg, estimate_token_count) for msg in messages)
     if tools:
         total += estimate_token_count(json.dumps(tools))
     return total
 
 
+def load_tokenizer(spec: str) -> Callable[[str], int]:
+    """Return a function counting the tokens of a text with a locally available tokenizer.
+
+    `spec` is either `tiktoken:<encoding or model name>` (e.g. `tiktoken:cl100k_base`)
+    or the path to a Hugging Face `tokenizer.json` file.
+    """
+    if spec.startswith("tiktoken:"):
+        import tiktoken
+
+        name = spec[len("tiktoken:") :]
+        try:
+            enc = tiktoken.get_encoding(name)
+        except ValueError:
+            enc = tiktoken.encoding_for_model(name)
+        return lambda text: len(enc.encode(text, disallowed_special=()))
+    from tokenizers import Tokenizer
+
+    tokenizer = Tokenizer.from_file(spec)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class TokenCounter(object):
+    """Counts message and tools tokens, caching the count of each object it has seen.
+
+    Agents and user simulators only append to their message lists, so across
+    steps of a conversation only the new messages are tokenized. Entries are
+    keyed on object identity, so messages must not be mutated after they are
+    counted; `truncate_messages` only ever replaces them with copies.
+    """
+
+    def __init__(
+        self, count_text: Callable[[str], int], max_cached: int = 16384
+    ) -> None:
+        self.count_text = count_text
+        self.max_cached = max_cached
+        self._cache: Dict[int, Tuple[Any, int]] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, obj: Any, count: Callable[[], int]) -> int:
+        entry = self._cache.get(id(obj))
+        # the reference kept in the entry prevents the id from being reused
+        if entry is not None and entry[0] is obj:
+            return entry[1]
+        value = count()
+        with self._lock:
+            if len(self._cache) >= self.max_cached:
+                # evict the oldest entry; conversations only keep recent messages
+                del self._cache[next(iter(self._cache))]
+            self._cache[id(obj)] = (obj, value)
+        return value
+
+    def count_message(self, msg: Dict[str, Any]) -> int:
+        return self._cached(msg, lambda: _count_message_tokens(msg, self.count_text))
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.count_message(msg) for msg in messages)
+
+    def count_tools(self, tools: Optional[List[Dict[str, Any]]]) -> int:
+        if not tools:
+            return 0
+        return self._cached(tools, lambda: self.count_text(json.dumps(tools)))
+
+
+def _truncate_content(msg: Dict[str, Any], max_chars: int = 3000) -> Dict[str, Any]:
+    content = msg.get("content")
+    if content and isinstance(content, str) and len(content) > max_chars:
+        msg = msg.copy()
+        msg["content"] = content[:max_chars] + "\n...[truncated]"
+    return msg
+
+
+_token_counter = TokenCounter(estimate_token_count)
+_max_context_length = DEFAULT_MAX_CONTEXT_LENGTH
+
+
+def set_tokenizer(spec: Optional[str]) -> None:
+    """Count tokens with the tokenizer described by `spec` (see `load_tokenizer`).
+
+    `None` restores the character-based estimate.
+    """
+    global _token_counter
+    count_text = estimate_token_count if spec is None else load_tokenizer(spec)
+    _token_counter = TokenCounter(count_text)
+
+
+def set_max_context_length(max_context_length: int) -> None:
+    """Set the default context length, e.g. to vLLM's `--max-model-len`."""
+    global _max_context_length
+    _max_context_length = max_context_length
+
+
+@traced(TRUNCATE)
 def truncate_messages(
     messages: List[Dict[str, Any]],
-    max_context_length: int = DEFAULT_MAX_CONTEXT_LENGTH,
+    max_context_length: Optional[int] = None,
     response_reserve: int = RESPONSE_TOKEN_RESERVE,
     tools: Optional[List[Dict[str, Any]]] = None,
 ) -> List[Dict[str, Any]]:
@@ -46,11 +153,23 @@ def truncate_messages(
     - Remove older conversation messages from the middle when the total exceeds the limit.
     - Also truncates individual message content if a single message is too long.
     """
+    return _truncate_messages(messages, max_context_length, response_reserve, tools)
+
+
+def _truncate_messages(
+    messages: List[Dict[str, Any]],
+    max_context_length: Optional[int],
+    response_reserve: int,
+    tools: Optional[List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
     if not messages:
         return messages
 
+    counter = _token_counter
+    if max_context_length is None:
+        max_context_length = _max_context_length
     token_budget = max_context_length - response_reserve
-    tools_tokens = estimate_token_count(json.dumps(tools)) if tools else 0
+    tools_tokens = counter.count_tools(tools)
     available_for_messages = token_budget - tools_tokens
 
     if available_for_messages <= 0:
@@ -58,7 +177,7 @@ def truncate_messages(
         return messages[-1:]
 
     # Check if we're already within budget
-    current_tokens = estimate_messages_tokens(messages)
+    current_tokens = counter.count_messages(messages)
     if current_tokens <= available_for_messages:
         return messages
 
@@ -72,18 +191,11 @@ def truncate_messages(
             conv_messages.append(msg)
 
     # First, truncate long individual message contents
-    def truncate_content(msg: Dict[str, Any], max_chars: int = 3000) -> Dict[str, Any]:
-        msg = msg.copy()
-        content = msg.get("content")
-        if content and isinstance(content, str) and len(content) > max_chars:
-            msg["content"] = content[:max_chars] + "\n...[truncated]"
-        return msg
-
-    system_messages = [truncate_content(m, max_chars=4000) for m in system_messages]
-    conv_messages = [truncate_content(m) for m in conv_messages]
+    system_messages = [_truncate_content(m, max_chars=4000) for m in system_messages]
+    conv_messages = [_truncate_content(m) for m in conv_messages]
 
     # Calculate system message tokens
-    system_tokens = estimate_messages_tokens(system_messages)
+    system_tokens = counter.count_messages(system_messages)
 
     # Budget remaining for conversation messages
     conv_budget = available_for_messages - system_tokens
@@ -100,21 +212,140 @@ def truncate_messages(
 
     # Keep removing oldest conversation messages until we fit
     # Always try to keep the first user message and the most recent messages
-    while len(conv_messages) > 1:
-        current_conv_tokens = estimate_messages_tokens(conv_messages)
+    conv_queue: Deque[Dict[str, Any]] = deque(conv_messages)
+    conv_counts: Deque[int] = deque(counter.count_message(m) for m in conv_messages)
+    current_conv_tokens = sum(conv_counts)
+    while len(conv_queue) > 1:
         if current_conv_tokens <= conv_budget:
             break
         # Remove the oldest conversation message (index 0), but try to keep at least the last 2
-        if len(conv_messages) <= 2:
+        if len(conv_queue) <= 2:
             # Truncate the remaining messages more aggressively
-            conv_messages = [truncate_content(m, max_chars=500) for m in conv_messages]
+            conv_queue = deque(_truncate_content(m, max_chars=500) for m in conv_queue)
             break
-        conv_messages.pop(0)
+        conv_queue.popleft()
+        current_conv_tokens -= conv_counts.popleft()
 
-    result = system_messages + conv_messages
+    result = system_messages + list(conv_queue)
 
     # Final safety check: if still too long, aggressively truncate all content
-    if estimate_messages_tokens(result) > available_for_messages:
-        result = [truncate_content(m, max_chars=300) for m in result]
+    if counter.count_messages(result) > available_for_messages:
+        result = [_truncate_content(m, max_chars=300) for m in result]
 
     return result
+
+
+@traced(TRUNCATE)
+def elide_messages(
+    messages: List[Dict[str, Any]],
+    max_context_length: Optional[int] = None,
+    response_reserve: int = RESPONSE_TOKEN_RESERVE,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    num_pinned_messages: int = DEFAULT_NUM_PINNED_MESSAGES,
+    chunk_size: int = DEFAULT_ELISION_CHUNK_SIZE,
+) -> List[Dict[str, Any]]:
+    """Fit messages within the max context length while keeping the prompt prefix stable.
+
+    `truncate_messages` drops the oldest conversation message whenever the
+    limit is hit, so once a conversation is long the start of the prompt
+    changes on every step and a server with prefix caching (e.g. vLLM's
+    automatic prefix caching) has to prefill it from scratch. Here the system
+    messages and the first `num_pinned_messages` conversation messages are
+    kept, and the messages right after them are elided in multiples of
+    `chunk_size`, so the prompt only changes at chunk boundaries.
+
+    Falls back to `truncate_messages` if no such prompt fits.
+    """
+    if not messages:
+        return messages
+
+    counter = _token_counter
+    if max_context_length is None:
+        max_context_length = _max_context_length
+    available_for_messages = (
+        max_context_length - response_reserve - counter.count_tools(tools)
+    )
+    if counter.count_messages(messages) <= available_for_messages:
+        return messages
+
+    fitted = [
+        _truncate_content(m, max_chars=4000 if m.get("role") == "system" else 3000)
+        for m in messages
+    ]
+    pinned_end = 0
+    while pinned_end < len(fitted) and fitted[pinned_end].get("role") == "system":
+        pinned_end += 1
+    pinned_end = min(pinned_end + num_pinned_messages, len(fitted))
+    # a tool result must follow the assistant message that called it
+    while pinned_end < len(fitted) and fitted[pinned_end].get("role") == "tool":
+        pinned_end += 1
+    head, rest = fitted[:pinned_end], fitted[pinned_end:]
+
+    head_tokens = counter.count_messages(head)
+    suffix_tokens = [0] * (len(rest) + 1)
+    for i in range(len(rest) - 1, -1, -1):
+        suffix_tokens[i] = suffix_tokens[i + 1] + counter.count_message(rest[i])
+    for cut in range(0, len(rest), chunk_size):
+        start = cut
+        while start < len(rest) and rest[start].get("role") == "tool":
+            start += 1
+        if start == len(rest):
+            break
+        if head_tokens + suffix_tokens[start] <= available_for_messages:
+            return head + rest[start:]
+    return _truncate_messages(messages, max_context_length, response_reserve, tools)
+
+
+class ContextWindow(object):
+    """Fits the prompts of one conversation within the max context length.
+
+    `mode` is `truncate` (`truncate_messages`) or `prefix-stable`
+    (`elide_messages`). Also estimates the share of prompt tokens a prefix
+    cache would serve, assuming each prompt can reuse its longest common
+    prefix with the previous prompt of the same conversation.
+    """
+
+    def __init__(
+        self, tools: Optional[List[Dict[str, Any]]] = None, mode: str = "truncate"
+    ) -> None:
+        assert mode in CONTEXT_MODES, f"Unknown context mode: {mode}"
+        self.tools = tools
+        self.mode = mode
+        self.num_prompts = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self._previous_prompt: Optional[List[Dict[str, Any]]] = None
+
+    def fit(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.mode == "prefix-stable":
+            prompt = elide_messages(messages, tools=self.tools)
+        else:
+            prompt = truncate_messages(messages, tools=self.tools)
+        self._record(prompt)
+        return prompt
+
+    def _record(self, prompt: List[Dict[str, Any]]) -> None:
+        counter = _token_counter
+        tools_tokens = counter.count_tools(self.tools)
+        self.num_prompts += 1
+        self.prompt_tokens += tools_tokens + counter.count_messages(prompt)
+        previous = self._previous_prompt
+        if previous is not None:
+            self.cached_prompt_tokens += tools_tokens
+            for a, b in zip(previous, prompt):
+                if a is not b and a != b:
+                    break
+                self.cached_prompt_tokens += counter.count_message(b)
+        # callers may keep appending to the list they were given
+        self._previous_prompt = list(prompt)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "num_prompts": self.num_prompts,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "expected_prefix_cache_hit_rate": (
+                self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            ),
+        }
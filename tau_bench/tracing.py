@@ -0,0 +1,174 @@
+# Copyright Sierra
+
+"""Lightweight per-episode latency tracing.
+
+The runner activates a `Tracer` for each episode; code on the episode path
+records spans with `span(...)` or `@traced(...)`, which are no-ops when no
+tracer is active. The active tracer lives in a context variable, so it follows
+the episode across `asyncio` tasks and `asyncio.to_thread` calls.
+"""
+
+import json
+import time
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+AGENT_LLM = "agent_llm"
+USER_LLM = "user_llm"
+TOOL = "tool"
+TRUNCATE = "truncate_messages"
+REWARD = "calculate_reward"
+EPISODE = "episode"
+
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "tau_bench_tracer", default=None
+)
+
+
+class Tracer(object):
+    def __init__(self) -> None:
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    def summary(self) -> Dict[str, Any]:
+        phases: Dict[str, Dict[str, Any]] = {}
+        for s in self.spans:
+            phase = phases.setdefault(
+                s["name"],
+                {"count": 0, "total_time": 0.0, "prompt_tokens": 0, "completion_tokens": 0},
+            )
+            phase["count"] += 1
+            phase["total_time"] += s["duration"]
+            phase["prompt_tokens"] += s.get("prompt_tokens") or 0
+            phase["completion_tokens"] += s.get("completion_tokens") or 0
+        return {"phases": phases, "counters": self.counters, "spans": self.spans}
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Record the wall time of the enclosed block under the active tracer.
+
+    Yields a dict that the caller may add attributes to (e.g. token counts).
+    """
+    tracer = _current_tracer.get()
+    record: Dict[str, Any] = {"name": name, **attrs}
+    if tracer is None:
+        yield record
+        return
+    record["start"] = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = time.perf_counter() - start
+        tracer.spans.append(record)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to a counter of the active tracer, e.g. for retries."""
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        tracer.counters[name] = tracer.counters.get(name, 0) + n
+
+
+@contextmanager
+def untraced() -> Iterator[None]:
+    """Record nothing in the enclosed block, e.g. for internal replays."""
+    token = _current_tracer.set(None)
+    try:
+        yield
+    finally:
+        _current_tracer.reset(token)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_usage(record: Dict[str, Any], res: Any) -> None:
+    usage = getattr(res, "usage", None)
+    if usage is None:
+        return
+    record["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+    record["completion_tokens"] = getattr(usage, "completion_tokens", None)
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    if len(values) == 0:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize_traces(traces: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-phase span count, total time and p50/p95/p99 latency across episodes."""
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        for s in trace["spans"]:
+            durations.setdefault(s["name"], []).append(s["duration"])
+    return {
+        name: {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+def export_chrome_trace(traces: List[Dict[str, Any]], path: str) -> None:
+    """Write the spans as Chrome trace events (chrome://tracing, ui.perfetto.dev).
+
+    Each trace must carry a `label` (e.g. "task 3, trial 0") and becomes a row.
+    """
+    events = []
+    for tid, trace in enumerate(traces):
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 0,
+                "tid": tid,
+                "args": {"name": trace["label"]},
+            }
+        )
+        for s in trace["spans"]:
+            args = {k: v for k, v in s.items() if k not in ["name", "start", "duration"]}
+            events.append(
+                {
+                    "name": s["name"],
+                    "ph": "X",
+                    "pid": 0,
+                    "tid": tid,
+                    "ts": s["start"] * 1e6,
+                    "dur": s["duration"] * 1e6,
+                    "args": args,
+                }
+            )
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events}, f)
@@ -84,7 +84,31 @@ class RunConfig(BaseModel):
     task_ids: Optional[List[int]] = None
     log_dir: str = "results"
     max_concurrency: int = 1
+    adaptive_concurrency: bool = False
+    min_concurrency: int = 1
+    concurrency_log_path: Optional[str] = None
     seed: int = 10
     shuffle: int = 0
     user_strategy: str = "llm"
     few_shot_displays_path: Optional[str] = None
+    runtime: str = "thread"
+    num_shards: int = 1
+    shard_index: Optional[int] = None
+    run_name: Optional[str] = None
+    resume_path: Optional[str] = None
+    trace_path: Optional[str] = None
+    tokenizer: Optional[str] = None
+    max_context_length: Optional[int] = None
+    context_mode: str = "truncate"
+    llm_cache_path: Optional[str] = None
+    llm_cache_mode: str = "read-write"
+    llm_cache_max_size_mb: Optional[float] = None
+    llm_cache_max_age_days: Optional[float] = None
+    llm_timeout: Optional[float] = None
+    llm_max_retries: int = 4
+    coalesce_requests: bool = False
+    llm_max_connections: Optional[int] = None
+    llm_http2: bool = False
+    compact_data: bool = False
+    record_path: Optional[str] = None
+    replay_path: Optional[str] = None
@@ -0,0 +1,83 @@
+# Copyright Sierra
+
+from typing import Any, List
+
+import pytest
+from litellm import ModelResponse
+
+from tau_bench import llm
+from tau_bench.llm_cache import LLMCache, cache_namespace
+
+
+class SamplingModel(object):
+    """Returns a different sample on every call."""
+
+    def __init__(self) -> None:
+        self.num_calls = 0
+
+    def __call__(self, **kwargs: Any) -> ModelResponse:
+        self.num_calls += 1
+        res = ModelResponse(
+            choices=[
+                {"message": {"role": "assistant", "content": f"sample {self.num_calls}"}}
+            ]
+        )
+        res._hidden_params["response_cost"] = 0.0
+        return res
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch) -> SamplingModel:
+    model = SamplingModel()
+    monkeypatch.setattr(llm.litellm, "completion", model)
+    llm.set_llm_cache(LLMCache(str(tmp_path / "cache.db")))
+    yield model
+    llm.set_llm_cache(None)
+
+
+def sample(num_samples: int, **kwargs: Any) -> List[str]:
+    messages = [{"role": "user", "content": "Hi! How can I help you today?"}]
+    return [
+        llm.completion(model="gpt-4o", messages=messages, **kwargs)
+        .choices[0]
+        .message.content
+        for _ in range(num_samples)
+    ]
+
+
+def test_repeated_sampled_requests_get_new_samples(model: SamplingModel) -> None:
+    with cache_namespace("trial-0"):
+        samples = sample(3)
+    assert samples == ["sample 1", "sample 2", "sample 3"]
+    assert model.num_calls == 3
+
+
+def test_repeated_sampled_requests_replay_in_order(model: SamplingModel) -> None:
+    with cache_namespace("trial-0"):
+        samples = sample(3)
+    with cache_namespace("trial-0"):
+        assert sample(4) == samples + ["sample 4"]
+    assert model.num_calls == 4
+    assert llm.get_llm_cache().stats()["hits"] == 3
+
+
+def test_trials_get_their_own_samples(model: SamplingModel) -> None:
+    with cache_namespace("trial-0"):
+        sample(2)
+    with cache_namespace("trial-1"):
+        assert sample(2) == ["sample 3", "sample 4"]
+
+
+def test_deterministic_requests_are_cached_once(model: SamplingModel) -> None:
+    with cache_namespace("trial-0"):
+        assert sample(3, temperature=0) == ["sample 1"] * 3
+    assert model.num_calls == 1
+
+
+def test_closed_cache_reopens(model: SamplingModel) -> None:
+    with cache_namespace("trial-0"):
+        samples = sample(2)
+    llm.get_llm_cache().close()
+    with cache_namespace("trial-0"):
+        assert sample(2) == samples
+    assert model.num_calls == 2
@@ -0,0 +1,85 @@
+# Copyright Sierra
+
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from litellm import ModelResponse
+
+from tau_bench import llm
+from tau_bench.envs import get_env
+from tau_bench.envs import user as user_module
+from tau_bench.envs.user import UserStrategy, load_user
+
+# the verify and reflection strategies also ask the model to verify the sample
+VERIFY_CALLS = {
+    UserStrategy.HUMAN: 0,
+    UserStrategy.LLM: 0,
+    UserStrategy.REACT: 0,
+    UserStrategy.VERIFY: 1,
+    UserStrategy.REFLECTION: 1,
+}
+
+
+class CountingModel(object):
+    def __init__(self) -> None:
+        self.requests: List[Dict[str, Any]] = []
+
+    def respond(self, **kwargs: Any) -> ModelResponse:
+        self.requests.append(kwargs)
+        if kwargs["messages"][-1]["content"].startswith("You are a supervisor"):
+            content = "true"
+        else:
+            content = "Thought:\nI should ask about my order.\nUser Response:\nHi!"
+        res = ModelResponse(choices=[{"message": {"role": "assistant", "content": content}}])
+        res._hidden_params["response_cost"] = 0.0
+        return res
+
+    async def arespond(self, **kwargs: Any) -> ModelResponse:
+        return self.respond(**kwargs)
+
+    def num_user_turns(self) -> int:
+        return sum(
+            not request["messages"][-1]["content"].startswith("You are a supervisor")
+            for request in self.requests
+        )
+
+
+@pytest.fixture
+def model(monkeypatch) -> CountingModel:
+    model = CountingModel()
+    for module in [llm, user_module]:
+        monkeypatch.setattr(module, "completion", model.respond)
+        monkeypatch.setattr(module, "acompletion", model.arespond)
+    monkeypatch.setattr("builtins.input", lambda prompt="": "Hi!")
+    return model
+
+
+@pytest.mark.parametrize("user_strategy", list(UserStrategy))
+def test_load_user_makes_no_model_calls(model: CountingModel, user_strategy: UserStrategy) -> None:
+    load_user(user_strategy, model="gpt-4o", provider="openai")
+    assert model.requests == []
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+@pytest.mark.parametrize("user_strategy", list(UserStrategy))
+@pytest.mark.parametrize("env_name", ["retail", "airline"])
+def test_one_model_call_per_episode_start(
+    model: CountingModel, env_name: str, user_strategy: UserStrategy, use_async: bool
+) -> None:
+    env = get_env(
+        env_name,
+        user_strategy=user_strategy,
+        user_model="gpt-4o",
+        task_split="test",
+        user_provider="openai",
+        task_index=0,
+    )
+    assert model.requests == []
+    if use_async:
+        asyncio.run(env.areset(task_index=1))
+    else:
+        env.reset(task_index=1)
+    expected_turns = 0 if user_strategy == UserStrategy.HUMAN else 1
+    assert model.num_user_turns() == expected_turns
+    assert len(model.requests) == expected_turns + VERIFY_CALLS[user_strategy]